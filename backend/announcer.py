@@ -0,0 +1,87 @@
+import json
+import socket
+from machine import Timer
+from backend.config import config
+from backend.controller import controller
+from backend.logger import logger
+from backend.network_ import Network
+
+
+class Announcer:
+
+    GROUP: str = "239.255.82.76"
+    PORT: int = 12302
+    QUERY: bytes = b"RLD?"
+    ANNOUNCE_PERIOD: int = 5000
+    SO_CALLBACK: int = 20  # lwip socket event callback, as used by webrepl
+
+    _http_port: int | None
+    _socket: socket.socket | None
+    _timer: Timer
+
+    def __init__(self):
+        self._http_port = None
+        self._socket = None
+        self._timer = Timer()
+
+    def start(self, http_port: int):
+        self._http_port = http_port
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(
+            socket.getaddrinfo('0.0.0.0', self.PORT)[0][-1]
+        )
+        Network.join_multicast_group(self._socket, self.GROUP)
+        self._socket.setblocking(False)
+        self._socket.setsockopt(
+            socket.SOL_SOCKET, self.SO_CALLBACK, self._socket_callback
+        )
+        self._timer.init(
+            mode=Timer.PERIODIC,
+            period=self.ANNOUNCE_PERIOD,
+            callback=self._timer_callback
+        )
+        self.announce()
+        logger.info(
+            "Announcing on {}:{}", __file__, self.GROUP, self.PORT
+        )
+
+    def close(self):
+        self._timer.deinit()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def get_announcement(self) -> bytes:
+        return json.dumps({
+            'device_id': config.device_id,
+            'fuse_amount': config.fuse_amount,
+            'firmware_version': config.firmware_version,
+            'port': self._http_port,
+            'state': controller.program_state,
+            'state_version': controller.get_state_etag().strip("\"")
+        }).encode()
+
+    def announce(self, address: tuple = None):
+        if self._socket is None:
+            return
+        if address is None:
+            address = (self.GROUP, self.PORT)
+        try:
+            self._socket.sendto(self.get_announcement(), address)
+        except OSError as ex:
+            logger.exception("Could not send announcement", ex, __file__)
+
+    def _socket_callback(self, sock: socket.socket):
+        while True:
+            try:
+                data, address = sock.recvfrom(len(self.QUERY))
+            except OSError:
+                return
+            if data == self.QUERY:
+                self.announce(address)
+
+    def _timer_callback(self, _: Timer):
+        self.announce()
+
+
+announcer = Announcer()
@@ -1,3 +1,4 @@
+import json
 from backend.config import config
 from backend.address import Address
 from backend.hardware import hardware
@@ -13,6 +14,10 @@ class Command:
     _name: str
     _fired: bool
     _fireing: bool
+    _id: int | None
+    _changed_version: int
+    _state_listener: callable | None
+    _state_json: str | None
 
     def __init__(self, address: Address, timestamp: int, name: str):
         self._address = address
@@ -20,17 +25,31 @@ class Command:
         self._name = name
         self._fired = False
         self._fireing = False
+        self._id = None
+        self._changed_version = 0
+        self._state_listener = None
+        self._state_json = None
+
+    def set_state_listener(self, listener: callable | None):
+        self._state_listener = listener
+
+    def _state_changed(self):
+        self._state_json = None
+        if self._state_listener is not None:
+            self._state_listener(self)
 
     def _timer_callback(self, timer: Timer):
         hardware.fuse_off(self._address.fuse_index)
         self._fireing = False
         self._fired = True
+        self._state_changed()
         timer.deinit()
 
     def light(self):
-        logger.debug(f"Light {self}", __file__)
+        logger.debug("Light {}", __file__, self)
         hardware.fuse_on(self._address.fuse_index)
         self._fireing = True
+        self._state_changed()
         Timer().init(
             mode=Timer.ONE_SHOT,
             period=int(config.ignition_duration),
@@ -39,9 +58,15 @@ class Command:
 
     def increase_timestamp(self, offset: int):
         self._timestamp += offset
+        self._state_changed()
+
+    def set_timestamp(self, timestamp: int):
+        self._timestamp = timestamp
+        self._state_changed()
 
     def get_state(self) -> dict:
         return {
+            'id': self._id,
             'address': str(self._address),
             'timestamp': self._timestamp // 1000,
             'name': self._name,
@@ -49,6 +74,28 @@ class Command:
             'fireing': self._fireing,
         }
 
+    def get_state_json(self) -> str:
+        if self._state_json is None:
+            self._state_json = json.dumps(self.get_state())
+        return self._state_json
+
+    @property
+    def id(self) -> int | None:
+        return self._id
+
+    @id.setter
+    def id(self, value: int):
+        self._id = value
+        self._state_json = None
+
+    @property
+    def changed_version(self) -> int:
+        return self._changed_version
+
+    @changed_version.setter
+    def changed_version(self, value: int):
+        self._changed_version = value
+
     @property
     def address(self) -> Address:
         return self._address
@@ -1,5 +1,11 @@
+import json
 from backend.hardware import hardware
 from backend.logger import logger
+from backend.rl_exception import InvalidParameter, RlException
+
+
+class UnknownConfigKey(RlException):
+    pass
 
 
 class Config:
@@ -8,6 +14,8 @@ class Config:
     ADDRESS_BIT_INDICES: list[int] = [0, 1, 2, 3, 4, 5]
     FUSE_AMOUNT_BIT_INDICES: list[int] = [6, 7]
 
+    FIRMWARE_VERSION: str = "0.1.0"
+
     TIME_RESOLUTION: int = 100
     IGNITION_DURATION: int = 100
     EVENT_STREAM_PERIOD: int = 2000
@@ -17,14 +25,22 @@ class Config:
     _fuse_amount: int
     _master_ip: str
     _master_port: int
+    _version: int
+    _state_json: str | None
+    _state_json_version: int
 
     def __init__(self):
         self._device_id = f"remote{hardware.remote_device_index}"
-        logger.info(f"Detected device id: {self._device_id}", __file__)
+        logger.info("Detected device id: {}", __file__, self._device_id)
         self._fuse_amount = hardware.fuse_amount
-        logger.info(f"Detected fuse amount: {self._fuse_amount}", __file__)
+        logger.info(
+            "Detected fuse amount: {}", __file__, self._fuse_amount
+        )
         self._master_ip = None
         self._master_port = None
+        self._version = 0
+        self._state_json = None
+        self._state_json_version = -1
 
     @property
     def device_id(self) -> str:
@@ -34,6 +50,10 @@ class Config:
     def fuse_amount(self) -> int:
         return self._fuse_amount
 
+    @property
+    def firmware_version(self) -> str:
+        return self.FIRMWARE_VERSION
+
     @property
     def time_resolution(self) -> int:
         return self.TIME_RESOLUTION
@@ -50,13 +70,19 @@ class Config:
     def event_stream_retry_period(self) -> int:
         return self.EVENT_STREAM_RETRY_PERIOD
 
+    @property
+    def version(self) -> int:
+        return self._version
+
     @property
     def master_ip(self) -> str:
         return self._master_ip
 
     @master_ip.setter
     def master_ip(self, value: str):
-        logger.info(f"Set master ip to {value}")
+        logger.info("Set master ip to {}", __file__, value)
+        if value != self._master_ip:
+            self._version += 1
         self._master_ip = value
 
     @property
@@ -65,18 +91,53 @@ class Config:
 
     @master_port.setter
     def master_port(self, value: int):
-        logger.info(f"Set master port to {value}")
+        logger.info("Set master port to {}", __file__, value)
+        if value != self._master_port:
+            self._version += 1
         self._master_port = value
 
+    def _check_update(self, data: dict):
+        if not isinstance(data, dict):
+            raise InvalidParameter(
+                f"config update has to be an object: {data}"
+            )
+        for key in data:
+            if key not in ('log_level', 'module_log_levels'):
+                raise UnknownConfigKey(f"unknown config key: {key}")
+        if 'log_level' in data:
+            logger.level_value(data['log_level'])
+        module_levels = data.get('module_log_levels', {})
+        if not isinstance(module_levels, dict):
+            raise InvalidParameter(
+                f"module_log_levels has to be an object: {module_levels}"
+            )
+        for level in module_levels.values():
+            if level is not None:
+                logger.level_value(level)
+
+    def update(self, data: dict):
+        # validate everything first, a failing key must not leave the
+        # earlier ones applied
+        self._check_update(data)
+        if 'log_level' in data:
+            logger.level = data['log_level']
+        for module, level in data.get('module_log_levels', {}).items():
+            logger.set_module_level(module, level)
+        logger.info("Updated config: {}", __file__, data)
+        self._version += 1
+
     def get_state(self) -> dict:
         return {
             "config": {
                 "device_id": self.device_id,
                 "chip_amount": 1,
                 "fuse_amounts": [self.fuse_amount],
-                "debug": False,
+                "debug": logger.level == 'debug',
+                "log_level": logger.level,
+                "module_log_levels": logger.module_levels,
                 "master_ip": self.master_ip,
-                "master_port": self.master_port
+                "master_port": self.master_port,
+                "firmware_version": self.firmware_version
             },
             "constants": {
                 "time_resolution": self.time_resolution / 1000,
@@ -86,5 +147,11 @@ class Config:
             }
         }
 
+    def get_state_json(self) -> str:
+        if self._state_json_version != self._version:
+            self._state_json = json.dumps(self.get_state())
+            self._state_json_version = self._version
+        return self._state_json
+
 
 config = Config()
@@ -0,0 +1,62 @@
+import struct
+import hashlib
+from backend.rl_exception import RlException
+
+
+MAGIC: bytes = b"RLC1"
+# magic, action, sequence, target timestamp in milliseconds
+HEADER_FORMAT: str = "!4sBIQ"
+HEADER_SIZE: int = struct.calcsize(HEADER_FORMAT)
+SIGNATURE_SIZE: int = 8
+DATAGRAM_SIZE: int = HEADER_SIZE + SIGNATURE_SIZE
+
+
+class InvalidDatagram(RlException):
+    pass
+
+
+def hmac_sha256(key: bytes, message: bytes) -> bytes:
+    if len(key) > 64:
+        key = hashlib.sha256(key).digest()
+    key = key + bytes(64 - len(key))
+    inner = hashlib.sha256(bytes(b ^ 0x36 for b in key))
+    inner.update(message)
+    outer = hashlib.sha256(bytes(b ^ 0x5C for b in key))
+    outer.update(inner.digest())
+    return outer.digest()
+
+
+class ControlVerifier:
+
+    MAX_AGE: int = 1000  # milliseconds
+    MAX_LEAD: int = 3600000  # milliseconds
+
+    _key: bytes | None
+    _last_sequence: int
+
+    def __init__(self, key: bytes | None):
+        self._key = key
+        self._last_sequence = -1
+
+    @property
+    def enabled(self) -> bool:
+        return self._key is not None
+
+    def verify(self, datagram: bytes, now: int) -> tuple | None:
+        if self._key is None or len(datagram) != DATAGRAM_SIZE:
+            return None
+        header = datagram[:HEADER_SIZE]
+        magic, action, sequence, target = struct.unpack(HEADER_FORMAT, header)
+        # repeated and reordered datagrams are dropped before paying for
+        # the signature
+        if magic != MAGIC or sequence <= self._last_sequence:
+            return None
+        signature = hmac_sha256(self._key, header)[:SIGNATURE_SIZE]
+        if signature != datagram[HEADER_SIZE:]:
+            raise InvalidDatagram(f"{sequence}: bad signature")
+        if now - target > self.MAX_AGE:
+            raise InvalidDatagram(f"{sequence}: stale")
+        if target - now > self.MAX_LEAD:
+            raise InvalidDatagram(f"{sequence}: too far ahead")
+        self._last_sequence = sequence
+        return action, sequence, target
@@ -0,0 +1,144 @@
+import json
+import socket
+from backend import time_util as tu
+from backend.control_packet import (
+    DATAGRAM_SIZE, ControlVerifier, InvalidDatagram
+)
+from backend.controller import controller
+from backend.logger import logger
+from backend.network_ import Network
+from backend.rl_exception import RlException
+from backend.schedule import Schedule
+
+
+class ControlReceiver:
+
+    GROUP: str = "239.255.82.76"
+    PORT: int = 12301
+    SO_CALLBACK: int = 20  # lwip socket event callback, as used by webrepl
+    # published in earlier versions of wlan_template.json
+    PLACEHOLDER_KEY: str = "shared_secret_for_multicast_control"
+
+    ACTION_ARM: int = 1
+    ACTION_GO: int = 2
+    ACTION_PAUSE: int = 3
+    ACTION_CONTINUE: int = 4
+    ACTION_STOP: int = 5
+
+    _verifier: ControlVerifier
+    _socket: socket.socket | None
+    _pending: Schedule | None
+
+    def __init__(self):
+        self._verifier = ControlVerifier(None)
+        self._socket = None
+        self._pending = None
+
+    def start(self):
+        try:
+            with open('wlan.json') as file:
+                key = json.load(file).get('control_key', None)
+        except OSError:
+            key = None
+        if not key:
+            logger.warning(
+                "No control key configured, multicast control disabled",
+                __file__
+            )
+            return
+        if key == self.PLACEHOLDER_KEY:
+            logger.error(
+                "Control key is the published placeholder, "
+                + "multicast control disabled",
+                __file__
+            )
+            return
+        self._verifier = ControlVerifier(key.encode())
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(
+            socket.getaddrinfo('0.0.0.0', self.PORT)[0][-1]
+        )
+        Network.join_multicast_group(self._socket, self.GROUP)
+        self._socket.setblocking(False)
+        self._socket.setsockopt(
+            socket.SOL_SOCKET, self.SO_CALLBACK, self._socket_callback
+        )
+        logger.info(
+            "Listening for control datagrams on {}:{}", __file__,
+            self.GROUP, self.PORT
+        )
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _socket_callback(self, sock: socket.socket):
+        while True:
+            try:
+                datagram = sock.recv(DATAGRAM_SIZE)
+            except OSError:
+                return
+            if not datagram:
+                return
+            try:
+                self.handle_datagram(datagram)
+            except Exception as ex:
+                logger.exception(
+                    "Exception while handling control datagram", ex, __file__
+                )
+
+    def handle_datagram(self, datagram: bytes) -> bool:
+        try:
+            verified = self._verifier.verify(datagram, tu.timestamp_now())
+        except InvalidDatagram as ex:
+            logger.warning("Dropped control datagram {}", __file__, ex.message)
+            return False
+        if verified is None:
+            return False
+        action, sequence, target = verified
+        logger.info(
+            "Control action {} ({}) at {}", __file__, action, sequence, target
+        )
+        self._dispatch(action, target)
+        return True
+
+    def _dispatch(self, action: int, target: int):
+        if action == self.ACTION_ARM:
+            try:
+                controller.schedule_program(tu.timestamp_to_string(target))
+            except RlException as ex:
+                logger.warning(
+                    "Could not arm program: {}", __file__, ex.message
+                )
+            return
+        callback = {
+            self.ACTION_GO: self._go,
+            self.ACTION_PAUSE: self._pause,
+            self.ACTION_CONTINUE: self._continue,
+            self.ACTION_STOP: self._stop
+        }.get(action, None)
+        if callback is None:
+            logger.warning("Unknown control action {}", __file__, action)
+            return
+        if self._pending is not None:
+            self._pending.cancel()
+        self._pending = Schedule(tu.timestamp_to_string(target), callback)
+        self._pending.start()
+
+    def _go(self, start_timestamp: int):
+        if controller.program_state == controller.STATE_SCHEDULED:
+            controller.unschedule_program()
+        controller.run_program(start_timestamp)
+
+    def _pause(self, _: int):
+        controller.pause_program()
+
+    def _continue(self, _: int):
+        controller.continue_program()
+
+    def _stop(self, _: int):
+        controller.stop_program()
+
+
+control_receiver = ControlReceiver()
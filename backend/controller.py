@@ -1,3 +1,4 @@
+import json
 import backend.time_util as tu
 from backend.program import Program
 from backend.address import Address
@@ -6,6 +7,8 @@ from backend.config import config
 from backend.schedule import Schedule
 from backend.logger import logger
 from backend.hardware import hardware
+from backend.ntp_client import ntp_client
+from backend.master_clock import master_clock
 from backend.rl_exception import RlException
 
 
@@ -29,6 +32,18 @@ class NoProgramPaused(RlException):
     pass
 
 
+class InvalidStateField(RlException):
+    pass
+
+
+class WrongDevice(RlException):
+    pass
+
+
+class ScheduleInPast(RlException):
+    pass
+
+
 class Controller:
 
     STATE_NOT_LOADED: str = 'not_loaded'
@@ -37,22 +52,91 @@ class Controller:
     STATE_RUNNING: str = 'running'
     STATE_PAUSED: str = 'paused'
 
+    STATE_FIELDS: tuple = (
+        'controller',
+        'hardware',
+        'config',
+        'schedule',
+        'program',
+        'update_needed',
+        'is_remote',
+        'clock'
+    )
+    COMMAND_LIST_FIELD: str = 'command_list'
+
     _program: Program
     _program_state: str
     _schedule: Schedule
+    _version: int
 
     def __init__(self):
         self._program = None
         self._program_state = self.STATE_NOT_LOADED
         self._schedule = None
+        self._version = 0
+        logger.guard_flush(self._milliseconds_to_next_cue)
+
+    def _bump_version(self):
+        self._version += 1
+
+    def _milliseconds_to_next_cue(self) -> int | None:
+        if self._program_state == self.STATE_SCHEDULED:
+            return self._schedule.milliseconds_left
+        if self._program_state == self.STATE_RUNNING:
+            return self._program.milliseconds_to_next_command()
+        return None
 
-    def load_program(self, name: str, json_data: list):
-        logger.info(f"Load program {name}", __file__)
+    def check_not_loaded(self):
         if self._program_state not in (self.STATE_NOT_LOADED,):
             raise ProgramAlreadyLoaded()
-        self._program = Program.from_json(name, json_data)
+
+    def load_program(
+        self, name: str, json_data: list, device_id: str = None
+    ):
+        logger.info("Load program {}", __file__, name)
+        self.check_not_loaded()
+        if device_id is not None and device_id.lower() != config.device_id:
+            raise WrongDevice(f"program is addressed to {device_id}")
+        self._program = Program.from_json(name, json_data, device_id)
         self._program_state = self.STATE_LOADED
-        logger.debug(f"Program {name} loaded", __file__)
+        self._bump_version()
+        logger.debug("Program {} loaded", __file__, name)
+
+    def load_binary_program(self, data: bytes):
+        header = Program.read_binary_header(data)
+        name, device_id = header[0], header[1]
+        logger.info("Load binary program {}", __file__, name)
+        self.check_not_loaded()
+        if device_id.lower() != config.device_id:
+            raise WrongDevice(f"program is addressed to {device_id}")
+        self._program = Program.from_binary(data, header)
+        self._program_state = self.STATE_LOADED
+        self._bump_version()
+        logger.debug("Program {} loaded", __file__, name)
+
+    def patch_program(self, changes: dict) -> dict:
+        logger.info("Patch program", __file__)
+        if self._program_state not in (
+            self.STATE_LOADED, self.STATE_SCHEDULED
+        ):
+            raise NotProgramLoaded()
+        if not isinstance(changes, dict):
+            raise Program.InvalidProgram(f"invalid patch: {changes}")
+        version = self._program.version
+        added = self._program.patch(
+            changes.get('add', []),
+            changes.get('remove', []),
+            changes.get('retime', [])
+        )
+        self._bump_version()
+        logger.debug(
+            "Program patched to version {}", __file__, self._program.version
+        )
+        return {
+            'version': self._program.version,
+            'added': added,
+            'removed': self._program.removed_command_ids(version)
+        }
 
     def unload_program(self):
         logger.info("Unload program", __file__)
@@ -62,13 +146,17 @@ class Controller:
         logger.debug("Program unloaded", __file__)
 
     def schedule_program(self, time: str):
-        logger.info(f"Schedule program for {time}", __file__)
+        logger.info("Schedule program for {}", __file__, time)
         if self._program_state not in (self.STATE_LOADED,):
             raise NotProgramLoaded()
-        self._schedule = Schedule(time, self.run_program)
-        self._schedule.start()
+        schedule = Schedule(time, self.run_program)
+        if schedule.milliseconds_left < 0:
+            raise ScheduleInPast(f"scheduled time has passed: {time}")
+        self._schedule = schedule
         self._program_state = self.STATE_SCHEDULED
-        logger.debug(f"Program scheduled for {time}", __file__)
+        self._bump_version()
+        schedule.start()
+        logger.debug("Program scheduled for {}", __file__, time)
 
     def unschedule_program(self):
         logger.info("Unschedule program", __file__)
@@ -77,16 +165,19 @@ class Controller:
         self._schedule.cancel()
         self._schedule = None
         self._program_state = self.STATE_LOADED
+        self._bump_version()
         logger.debug("Program unscheduled", __file__)
 
-    def run_program(self):
+    def run_program(self, start_timestamp: int = None):
         logger.info("Run program", __file__)
         if self._program_state not in (
             self.STATE_LOADED, self.STATE_SCHEDULED
         ):
             raise NotProgramLoaded()
-        self._program.run(self._program_finished_callback)
+        tu.hold_clock(True)
+        self._program.run(self._program_finished_callback, start_timestamp)
         self._program_state = self.STATE_RUNNING
+        self._bump_version()
         logger.debug("Program running", __file__)
 
     def pause_program(self):
@@ -95,6 +186,7 @@ class Controller:
             raise NoProgramRunning()
         self._program.pause()
         self._program_state = self.STATE_PAUSED
+        self._bump_version()
         logger.debug("Program paused", __file__)
 
     def continue_program(self):
@@ -103,6 +195,7 @@ class Controller:
             raise NoProgramPaused()
         self._program.continue_()
         self._program_state = self.STATE_RUNNING
+        self._bump_version()
         logger.debug("Program continued", __file__)
 
     def stop_program(self):
@@ -112,31 +205,57 @@ class Controller:
         self._program.stop()
         self._unload_program()
         logger.debug("Program stopped", __file__)
+        logger.flush()
 
     def run_testloop(self):
         logger.info("Run testloop", __file__)
         if self._program_state not in (self.STATE_NOT_LOADED,):
             raise ProgramAlreadyLoaded()
         self._program = Program.testloop_program()
+        tu.hold_clock(True)
         self._program.run(self._program_finished_callback)
         self._program_state = self.STATE_RUNNING
+        self._bump_version()
 
     def _program_finished_callback(self):
         self._unload_program()
         logger.info("Program finished", __file__)
+        logger.flush()
 
     def _unload_program(self):
         self._program_state = self.STATE_NOT_LOADED
         self._program = None
+        tu.hold_clock(False)
+        self._bump_version()
 
     def fire(self, letter: str, number: int):
-        logger.info(f"Fire {letter}{number}", __file__)
+        logger.info("Fire {}{}", __file__, letter, number)
         if self._program_state not in (self.STATE_NOT_LOADED,):
             raise ProgramAlreadyLoaded()
         address = Address(config.device_id, letter, number)
         command = Command(address, 0, f"manual_fire_command_{address}")
         command.light()
 
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def program_state(self) -> str:
+        return self._program_state
+
+    def get_state_etag(self) -> str:
+        program_version = 0 if self._program is None else self._program.version
+        # versions restart with every boot, the first record id does not
+        etag = (
+            f"{logger.boot_record_id}.{self._version}.{program_version}"
+            + f".{config.version}"
+            + f".{ntp_client.version}.{master_clock.version}"
+        )
+        if self._program_state in (self.STATE_SCHEDULED, self.STATE_RUNNING):
+            etag += f".{tu.timestamp_now() // 1000}"
+        return f"\"{etag}\""
+
     def get_system_time(self) -> str:
         return tu.get_system_time()
 
@@ -157,8 +276,84 @@ class Controller:
                 else self._program.get_state()
             ),
             'update_needed': None,
-            'is_remote': True
+            'is_remote': True,
+            'clock': master_clock.get_state()
         }
 
+    def _get_state_field_json(
+        self, field: str, with_command_list: bool
+    ) -> str:
+        if field == 'controller':
+            return json.dumps({
+                'state': self._program_state,
+                'system_time': tu.get_system_time(),
+            })
+        elif field == 'hardware':
+            return hardware.get_state_json()
+        elif field == 'config':
+            return config.get_state_json()
+        elif field == 'schedule':
+            return (
+                "null" if self._schedule is None
+                else json.dumps(self._schedule.get_state())
+            )
+        elif field == 'program':
+            return (
+                "null" if self._program is None
+                else self._program.get_state_json(with_command_list)
+            )
+        elif field == 'update_needed':
+            return "null"
+        elif field == 'is_remote':
+            return "true"
+        elif field == 'clock':
+            return json.dumps(master_clock.get_state())
+
+    def _check_state_fields(self, fields: list[str] | None) -> bool:
+        if fields is not None:
+            for field in fields:
+                if (
+                    field not in self.STATE_FIELDS
+                    and field != self.COMMAND_LIST_FIELD
+                ):
+                    raise InvalidStateField(f"unknown state field: {field}")
+        return fields is None or self.COMMAND_LIST_FIELD in fields
+
+    def get_state_json(self, fields: list[str] = None) -> str:
+        with_command_list = self._check_state_fields(fields)
+        return "{" + ", ".join(
+            f"\"{field}\": "
+            + self._get_state_field_json(field, with_command_list)
+            for field in self.STATE_FIELDS
+            if fields is None or field in fields
+        ) + "}"
+
+    def iter_state_json(self, fields: list[str] = None):
+        return self._iter_state_json(
+            fields, self._check_state_fields(fields)
+        )
+
+    def _iter_state_json(
+        self, fields: list[str] | None, with_command_list: bool
+    ):
+        separator = "{"
+        for field in self.STATE_FIELDS:
+            if fields is not None and field not in fields:
+                continue
+            yield separator + f"\"{field}\": "
+            if field == 'program' and self._program is not None:
+                yield from self._program.iter_state_json(with_command_list)
+            else:
+                yield self._get_state_field_json(field, with_command_list)
+            separator = ", "
+        yield "{}" if separator == "{" else "}"
+
+    def iter_program_commands_json(
+        self, offset: int, limit: int, since_version: int = None
+    ):
+        if self._program is None:
+            raise NotProgramLoaded()
+        return self._program.iter_commands_json(offset, limit, since_version)
+
 
 controller = Controller()
@@ -4,32 +4,61 @@ from machine import Timer
 from backend.hardware import hardware
 from backend.config import config
 from backend.event_stream import EventStream
+from backend.log_stream import LogStream
 from backend.request import Request
-from backend.response import Response
+from backend.response import Response, FileResponse, StreamResponse
+from backend.json_stream import iter_json
 from backend.controller import controller
+from backend.program import Program
 from backend.logger import logger
+from backend.program_cache import program_cache
 from backend.rl_exception import RlException
 
 
 class Endpoint:
 
+    METHOD_BITS: dict[str, int] = {
+        'GET': 1 << 0,
+        'HEAD': 1 << 1,
+        'POST': 1 << 2,
+        'PUT': 1 << 3,
+        'DELETE': 1 << 4,
+        'PATCH': 1 << 5,
+        'OPTIONS': 1 << 6
+    }
+
     _function: callable
     _methods: list[str]
-    _url_parameter_names: dict[int, str]
+    _method_mask: int
+    _allow_header: str
+    _url_parameter_names: list[str]
     _location: str
 
     def __init__(
         self,
         function: callable,
         methods: list[str],
-        url_parameter_names: dict[int, str],
+        url_parameter_names: list[str],
         location: str
     ):
         self._function = function
         self._methods = methods
+        self._method_mask = 0
+        for method in methods:
+            self._method_mask |= self.METHOD_BITS[method]
+        if self._method_mask & self.METHOD_BITS['GET']:
+            self._method_mask |= self.METHOD_BITS['HEAD']
+        self._method_mask |= self.METHOD_BITS['OPTIONS']
+        self._allow_header = ", ".join(
+            method for method in self.METHOD_BITS
+            if self._method_mask & self.METHOD_BITS[method]
+        )
         self._url_parameter_names = url_parameter_names
         self._location = location
 
+    def allows(self, method: str) -> bool:
+        return bool(self._method_mask & self.METHOD_BITS.get(method, 0))
+
     @property
     def function(self) -> callable:
         return self._function
@@ -39,7 +68,11 @@ class Endpoint:
         return self._methods
 
     @property
-    def url_parameter_names(self) -> dict[int, str]:
+    def allow_header(self) -> str:
+        return self._allow_header
+
+    @property
+    def url_parameter_names(self) -> list[str]:
         return self._url_parameter_names
 
     @property
@@ -63,61 +96,76 @@ class Router:
 
     URL_PARAMETER_PREFIX: str = "<"
     URL_PARAMETER_SUFFIX: str = ">"
-    URL_PAREMETER_KEY: str = r"{URL_PARAM}"
-    ROOT_SYMBOL: str = r"{ROOT}"
 
-    _endpoints: dict
+    _static_endpoints: dict[str, Endpoint]
+    _parameter_endpoints: dict
 
     def __init__(self):
-        self._endpoints = self._new_node()
+        self._static_endpoints = {}
+        self._parameter_endpoints = self._new_node()
 
     def _new_node(self) -> dict:
         return {
             'endpoint': None,
-            'nodes': {}
+            'nodes': {},
+            'parameter': None,
+            'parameter_name': None
         }
 
-    def _split_location(self, location: str) -> list[str]:
-        directories = [self.ROOT_SYMBOL] + location.split("/")[1:]
-        if directories[-1] == "":
-            directories = directories[:-1]
-        return directories
+    def _normalize_location(self, location: str) -> str:
+        if len(location) > 1 and location[-1] == "/":
+            return location[:-1]
+        return location
+
+    def _is_url_parameter(self, directory: str) -> bool:
+        return (
+            len(directory) > 2
+            and directory[0] == self.URL_PARAMETER_PREFIX
+            and directory[-1] == self.URL_PARAMETER_SUFFIX
+        )
 
     def _register_endpoint(
         self, location: str, methods: list[str], func: callable
     ):
-        directories = self._split_location(location)
-
-        last_index = len(directories) - 1
-        node = self._endpoints
-        url_parameter_names = {}
+        location = self._normalize_location(location)
+        directories = [
+            directory for directory in location.split("/") if directory
+        ]
+        url_parameter_names = [
+            directory[1:-1] for directory in directories
+            if self._is_url_parameter(directory)
+        ]
+        endpoint = Endpoint(func, methods, url_parameter_names, location)
+
+        if not url_parameter_names:
+            if location in self._static_endpoints:
+                hardware.panic(f"duplicate endpoint: {location}")
+            self._static_endpoints[location] = endpoint
+            return
 
-        for idx, directory in enumerate(directories):
+        if len(set(url_parameter_names)) != len(url_parameter_names):
+            hardware.panic(f"duplicate path parameter name: {location}")
 
-            key = directory
-            if (
-                directory[0] == self.URL_PARAMETER_PREFIX
-                and directory[-1] == self.URL_PARAMETER_SUFFIX
-            ):
+        node = self._parameter_endpoints
+        for directory in directories:
+            if self._is_url_parameter(directory):
                 url_parameter_name = directory[1:-1]
-                if url_parameter_name in url_parameter_names:
+                if node['parameter'] is None:
+                    node['parameter'] = self._new_node()
+                    node['parameter']['parameter_name'] = url_parameter_name
+                node = node['parameter']
+                if node['parameter_name'] != url_parameter_name:
                     hardware.panic(
-                        "duplicate path parameter name: ",
-                        + url_parameter_name
+                        f"conflicting path parameter name: {location}"
                     )
-                url_parameter_names[idx] = url_parameter_name
-                key = self.URL_PAREMETER_KEY
-
-            if key not in node['nodes']:
-                node['nodes'][key] = self._new_node()
-            node = node['nodes'][key]
+            else:
+                if directory not in node['nodes']:
+                    node['nodes'][directory] = self._new_node()
+                node = node['nodes'][directory]
 
-            if idx == last_index and node['endpoint'] is not None:
-                hardware.panic(f"duplicate endpoint: {location}")
-
-        node['endpoint'] = Endpoint(
-            func, methods, url_parameter_names, location
-        )
+        if node['endpoint'] is not None:
+            hardware.panic(f"duplicate endpoint: {location}")
+        node['endpoint'] = endpoint
 
     def route(self, location: str, methods: list[str]):
         def decorator(func):
@@ -142,42 +190,53 @@ class Router:
             body=content
         )
 
-    def handle_request(self, request: Request) -> Response:
-        directories = self._split_location(request.location)
-        last_index = len(directories) - 1
-        node = self._endpoints
-        url_parameter_values = {}
-
-        for idx, directory in enumerate(directories):
-
-            key = directory
-            if directory not in node['nodes']:
-                url_parameter_values[idx] = directory
-                key = self.URL_PAREMETER_KEY
-
-            node = node['nodes'].get(key, None)
-            if node is None:
-                return Response(status_code=404)
+    def _find_parameter_endpoint(
+        self, location: str, request: Request
+    ) -> Endpoint | None:
+        node = self._parameter_endpoints
+        length = len(location)
+        start = 1
+        while start < length:
+            end = location.find("/", start)
+            if end == -1:
+                end = length
+            directory = location[start:end]
+            next_node = node['nodes'].get(directory, None)
+            if next_node is None:
+                next_node = node['parameter']
+                if next_node is None:
+                    return None
+                request.url_parameters[next_node['parameter_name']] = (
+                    directory
+                )
+            node = next_node
+            start = end + 1
+        return node['endpoint']
+
+    def _find_endpoint(self, request: Request) -> Endpoint | None:
+        location = self._normalize_location(request.location)
+        endpoint = self._static_endpoints.get(location, None)
+        if endpoint is None:
+            endpoint = self._find_parameter_endpoint(location, request)
+        return endpoint
 
-            if idx == last_index and node['endpoint'] is None:
-                return Response(status_code=404)
-
-        endpoint = node['endpoint']
-
-        if len(endpoint.url_parameter_names) != len(url_parameter_values):
-            return Response(status_code=404)
-        for value_idx, value in url_parameter_values.items():
-            name = endpoint.url_parameter_names.get(value_idx, None)
-            if name is None:
-                return Response(status_code=404)
-            request.url_parameters[name] = value
+    def handle_request(self, request: Request) -> Response:
+        endpoint = self._find_endpoint(request)
+        if endpoint is None:
+            return Response.status_response(404)
 
-        if request.method == 'OPTIONS':
-            return Response.preflight_response()
-        elif request.method not in endpoint.methods:
-            return Response(status_code=405)
+        method = request.method
+        if method == 'OPTIONS':
+            return Response.preflight_response(endpoint.allow_header)
+        if not endpoint.allows(method):
+            return Response.status_response(405, endpoint.allow_header)
 
         try:
+            if method == 'HEAD':
+                request.handle_head_as_get()
+                response = endpoint.function(request)
+                response.omit_body()
+                return response
             return endpoint.function(request)
         except RlException as ex:
             return self._build_exception_response(ex, True)
@@ -188,21 +247,65 @@ class Router:
 router = Router()
 
 
+STATIC_MAX_AGE: int = 604800  # seconds
+
+
+def _frontend_file_response(
+    request: Request,
+    filename: str,
+    content_type: str = Response.CONTENT_TYPE_PLAIN
+) -> Response:
+    path = "frontend/" + filename
+    range_header = request.headers.get("range", None)
+    response = None
+    if request.accepts_encoding("gzip"):
+        try:
+            response = FileResponse(
+                path + ".gz", content_type, range_header=range_header
+            )
+        except OSError:
+            pass
+        else:
+            response.add_header("Content-Encoding", "gzip")
+    if response is None:
+        response = FileResponse(
+            path, content_type, range_header=range_header
+        )
+    etag = FileResponse.content_etag(response.path)
+    if request.etag_matches(etag):
+        response = Response.not_modified_response(etag)
+    else:
+        response.add_header("ETag", etag)
+    response.add_header("Cache-Control", f"public, max-age={STATIC_MAX_AGE}")
+    response.add_header("Vary", "Accept-Encoding")
+    return response
+
+
+def _conditional_response(
+    request: Request, etag: str, build: callable
+) -> Response:
+    if request.etag_matches(etag):
+        return Response.not_modified_response(etag)
+    response = build()
+    response.add_header("ETag", etag)
+    response.add_header("Cache-Control", "no-cache")
+    return response
+
+
 @router.route("/", ['GET'])
 def endpoint_index(request: Request) -> Response:
-    with open("frontend/device.html", 'r') as file:
-        content = file.read()
-    content = content.format(
-        device_id=config.device_id,
-        fuse_amount=config.fuse_amount
-    )
-    return Response(body=content, content_type=Response.CONTENT_TYPE_HTML)
+    try:
+        return _frontend_file_response(
+            request, "device.html", Response.CONTENT_TYPE_HTML
+        )
+    except OSError:
+        return Response.status_response(404)
 
 
 @router.route("/favicon.ico", ['GET'])
 def endpoint_favicon(request: Request) -> Response:
     if config.master_ip is None or config.master_port is None:
-        return Response(status_code=404)
+        return Response.status_response(404)
     response = Response(status_code=301)
     response.add_header(
         "Location",
@@ -215,19 +318,45 @@ def endpoint_favicon(request: Request) -> Response:
 def endpoint_static(request: Request) -> Response:
     filename = request.url_parameters['path']
     try:
-        with open("frontend/" + filename, 'r') as file:
-            content = file.read()
+        return _frontend_file_response(request, filename)
     except OSError:
-        return Response(status_code=404)
-    else:
-        return Response(body=content, content_type=Response.CONTENT_TYPE_PLAIN)
+        return Response.status_response(404)
 
 
-@router.route("/program", ['POST', 'DELETE'])
+@router.route("/program", ['POST', 'PATCH', 'DELETE'])
 def endpoint_program(request: Request) -> Response:
     if request.method == 'POST':
-        json_data = request.json_payload
-        controller.load_program(json_data['name'], json_data['event_list'])
+        content_hash = None
+        if request.is_binary:
+            content = request.body
+        else:
+            json_data = request.json_payload
+            content = None
+            if 'hash' in json_data and 'event_list' not in json_data:
+                # loading touches the cache index on flash
+                controller.check_not_loaded()
+                content_hash = json_data['hash']
+                content = program_cache.load(content_hash)
+                if content is None:
+                    return Response.status_response(404)
+        if content is not None and Program.is_binary(content):
+            controller.load_binary_program(content)
+        else:
+            if content is not None:
+                json_data = json.loads(content)
+            controller.load_program(
+                json_data['name'],
+                json_data['event_list'],
+                json_data.get('device_id', None)
+            )
+        if content_hash is None:
+            content_hash = program_cache.store(request.body)
+        response = Response()
+        response.add_header("ETag", f"\"{content_hash}\"")
+        return response
+    elif request.method == 'PATCH':
+        result = controller.patch_program(request.json_payload)
+        return Response(body=json.dumps(result))
     elif request.method == 'DELETE':
         controller.unload_program()
 
@@ -255,6 +384,22 @@ def endpoint_program_control(request: Request) -> Response:
     return Response()
 
 
+PROGRAM_COMMANDS_LIMIT: int = 100
+
+
+@router.route("/program/commands", ['GET'])
+def endpoint_program_commands(request: Request) -> Response:
+    chunks = controller.iter_program_commands_json(
+        offset=max(request.get_int_parameter('offset', 0), 0),
+        limit=min(
+            max(request.get_int_parameter('limit', PROGRAM_COMMANDS_LIMIT), 0),
+            PROGRAM_COMMANDS_LIMIT
+        ),
+        since_version=request.get_int_parameter('since_version')
+    )
+    return StreamResponse(chunks)
+
+
 @router.route("/fire", ['POST'])
 def endpoint_fire(request: Request) -> Response:
     letter = request.json_payload['letter']
@@ -271,7 +416,7 @@ def endpoint_testloop(request: Request) -> Response:
 
 @router.route("/lock", ['POST'])
 def endpoint_lock(request: Request) -> Response:
-    return Response(status_code=501)
+    return Response.status_response(501)
 
 
 @router.route("/system-time", ['GET'])
@@ -280,90 +425,178 @@ def endpoint_system_time(request: Request) -> Response:
     return Response(body=json.dumps(content))
 
 
-@router.route("/event-stream", ['GET'])
-def endpoint_event_stream(request: Request) -> Response:
-    event_stream = EventStream(request.socket)
-
-    def timer_callbck(_):
-        event_stream.run()
-    # event_stream.run()
-    Timer().init(
-        mode=Timer.ONE_SHOT,
-        period=2000,
-        callback=timer_callbck
-    )
+def _event_stream_response(request: Request, start: callable) -> Response:
+    # a HEAD request only gets the headers, the socket is not streamed to
+    if not request.is_head:
+        start()
     return Response(
         content_type=Response.CONTENT_TYPE_EVENT_STREAM,
-        keep_alive=True
+        keep_alive=not request.is_head
     )
 
 
+@router.route("/event-stream", ['GET'])
+def endpoint_event_stream(request: Request) -> Response:
+    def start():
+        event_stream = EventStream(request.socket)
+
+        def timer_callbck(_):
+            event_stream.run()
+        # event_stream.run()
+        Timer().init(
+            mode=Timer.ONE_SHOT,
+            period=2000,
+            callback=timer_callbck
+        )
+    return _event_stream_response(request, start)
+
+
 @router.route("/state", ['GET'])
 def endpoint_state(request: Request) -> Response:
-    return Response(body=json.dumps(controller.get_state()))
+    fields = request.get_parameters.get('fields', None)
+    if fields is not None:
+        fields = [field for field in fields.split(",") if field]
+    return _conditional_response(
+        request,
+        controller.get_state_etag(),
+        lambda: StreamResponse(controller.iter_state_json(fields))
+    )
 
 
 @router.route("/logs", ['GET', 'DELETE'])
 def endpoint_logs(request: Request) -> Response:
     if request.method == 'GET':
-        return Response(body=json.dumps(logger.get_log_files()))
+        return StreamResponse(iter_json(logger.get_log_files()))
     elif request.method == 'DELETE':
         logger.delete_all_logfiles()
         return Response()
 
 
+@router.route("/logs/query", ['GET'])
+def endpoint_logs_query(request: Request) -> Response:
+    parameters = request.get_parameters
+    name = parameters.get('file', None)
+    if name is not None and not logger.logfile_exists(name):
+        return Response.status_response(404)
+    logger.flush()
+    return StreamResponse(logger.iter_log_query(
+        name=name,
+        level=parameters.get('level', None),
+        module=parameters.get('module', None),
+        since=request.get_int_parameter('since'),
+        until=request.get_int_parameter('until'),
+        text=parameters.get('text', None),
+        offset=request.get_int_parameter('offset', 0),
+        limit=min(
+            request.get_int_parameter('limit', logger.QUERY_LIMIT),
+            logger.QUERY_LIMIT
+        )
+    ))
+
+
+@router.route("/logs/stream", ['GET'])
+def endpoint_logs_stream(request: Request) -> Response:
+    level = request.get_parameters.get('level', None)
+    boot_last_id = logger.boot_record_id - 1
+    last_id = request.headers.get("last-event-id", None)
+    if last_id is None:
+        last_id = request.get_int_parameter('since_id', boot_last_id)
+    else:
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            last_id = boot_last_id
+    log_stream = LogStream(
+        request.socket,
+        0 if level is None else logger.level_value(level),
+        last_id
+    )
+    return _event_stream_response(request, log_stream.run)
+
+
 @router.route("/logs/<filename>", ['GET', 'DELETE'])
 def endpoint_logs_filename(request: Request) -> Response:
     filename = request.url_parameters['filename']
     if logger.logfile_exists(filename):
         if request.method == 'GET':
-            return Response(
-                body=logger.get_log_file_content(filename),
+            logger.flush()
+            return StreamResponse(
+                logger.iter_log_text(filename),
                 content_type=Response.CONTENT_TYPE_PLAIN
             )
         elif request.method == 'DELETE':
             logger.delete_logfile(filename)
             return Response()
     else:
-        return Response(status_code=404)
+        return Response.status_response(404)
 
 
 @router.route("/logs/structured/<filename>", ['GET'])
 def endpoint_logs_structured_filename(request: Request) -> Response:
     filename = request.url_parameters['filename']
     if logger.logfile_exists(filename):
-        structured_log = logger.get_log_structured_content(filename)
-        return Response(body=json.dumps(structured_log))
+        logger.flush()
+        return StreamResponse(logger.iter_log_structured(filename))
+    else:
+        return Response.status_response(404)
+
+
+@router.route("/logs/raw/<filename>", ['GET'])
+def endpoint_logs_raw_filename(request: Request) -> Response:
+    filename = request.url_parameters['filename']
+    if logger.logfile_exists(filename):
+        logger.flush()
+        try:
+            return FileResponse(
+                logger.get_log_file_path(filename),
+                content_type=Response.CONTENT_TYPE_OCTET_STREAM,
+                range_header=request.headers.get("range", None)
+            )
+        except OSError:
+            return Response.status_response(404)
     else:
-        return Response(status_code=404)
+        return Response.status_response(404)
 
 
 @router.route("/config", ['GET', 'POST'])
 def endpoint_config(request: Request) -> Response:
     if request.method == 'GET':
-        content = json.dumps({
-            "device_id": config.device_id,
-            "fuse_amount": config.fuse_amount,
-            "time_resolution": config.time_resolution,
-            "ignition_duration": config.ignition_duration / 1000
-        })  # TODO: put dict creation into config
-        return Response(body=content)
+        def build() -> Response:
+            content = json.dumps({
+                "device_id": config.device_id,
+                "fuse_amount": config.fuse_amount,
+                "time_resolution": config.time_resolution,
+                "ignition_duration": config.ignition_duration / 1000,
+                "log_level": logger.level,
+                "module_log_levels": logger.module_levels
+            })  # TODO: put dict creation into config
+            return Response(body=content)
+        return _conditional_response(
+            request, f"\"{logger.boot_record_id}.{config.version}\"", build
+        )
     elif request.method == 'POST':
-        return Response(status_code=501)
+        config.update(request.json_payload)
+        return Response()
 
 
 @router.route("/update", ['POST'])
 def endpoint_update(request: Request) -> Response:
-    return Response(status_code=501)
+    return Response.status_response(501)
 
 
-@router.route("/discover", ['GET'])
+@router.route("/discover", ['GET', 'POST'])
 def endpoint_discover(request: Request) -> Response:
-    config.master_ip = request.client_address
-    config.master_port = request.client_port
+    if request.method == 'POST':
+        config.master_ip = request.client_address
+        config.master_port = request.json_payload.get('port', None)
     content = json.dumps({
         "device_id": config.device_id,
-        "is_remote": True
+        "is_remote": True,
+        "fuse_amount": config.fuse_amount,
+        "firmware_version": config.firmware_version,
+        "state": controller.program_state,
+        "master_ip": config.master_ip,
+        "master_port": config.master_port
     })
     return Response(body=content)
 
@@ -1,6 +1,5 @@
 import socket
 from machine import Timer
-import json
 from backend.config import config
 from backend.logger import logger
 from backend.controller import controller
@@ -55,8 +54,8 @@ class EventStream:
 
     def _event_content(self) -> str:
         print(f"Content sent: {self._counter}")
-        data = controller.get_state()
+        data = controller.get_state_json()
         content = f"retry: {config.event_stream_retry_period}\n"
-        content += f"data: {json.dumps(data)}\n"
+        content += f"data: {data}\n"
         content += f"id: {self._counter}\n\n"
         return content
@@ -1,3 +1,4 @@
+import json
 from machine import Pin, WDT, deepsleep, Timer
 from backend.logger import logger
 
@@ -18,8 +19,10 @@ class Hardware:
 
     _remote_device_index: int
     _fuse_amount: int
+    _state_json: str | None
 
     def __init__(self):
+        self._state_json = None
         self._dip_pins = [Pin(id_, Pin.IN) for id_ in self.DIP_PIN_IDS]
         self._fuse_pins = [Pin(id_, Pin.OUT) for id_ in self.FUSE_PIN_IDS]
         self._led_pins = [Pin(id_, Pin.OUT) for id_ in self.LED_PIN_IDS]
@@ -55,11 +58,11 @@ class Hardware:
             pin.value(0)
 
     def fuse_on(self, index: int):
-        logger.debug(f"Fuse {index} on", __file__)
+        logger.debug("Fuse {} on", __file__, index)
         self._fuse_pins[index].value(1)
 
     def fuse_off(self, index: int):
-        logger.debug(f"Fuse {index} off", __file__)
+        logger.debug("Fuse {} off", __file__, index)
         self._fuse_pins[index].value(0)
 
     @property
@@ -78,22 +81,26 @@ class Hardware:
     def _secure(self):
         from backend.led import led
         from backend.event_stream import EventStream
+        from backend.log_stream import LogStream
         led.off()
         self.leds_off()
         EventStream.close_all()
+        LogStream.close_all()
         for fuse_index in range(self.fuse_amount):
             self.fuse_off(fuse_index)
 
     def panic(self, message: str):
-        logger.error(f"Panic: {message}", __file__)
+        logger.error("Panic: {}", __file__, message)
         from backend.led import led
         self._secure()
+        logger.flush(force=True)
         led.on()
         raise RuntimeError(f"panic: {message}")
 
     def _shutdown(self):
         logger.info("Shutdown", __file__)
         self._secure()
+        logger.close()
         deepsleep()
 
     def shutdown(self):
@@ -106,6 +113,7 @@ class Hardware:
     def _reboot(self):
         logger.info("Reboot", __file__)
         self._secure()
+        logger.close()
         WDT(id=1, timeout=1000)
         while True:
             pass
@@ -122,5 +130,10 @@ class Hardware:
             "is_locked": False
         }
 
+    def get_state_json(self) -> str:
+        if self._state_json is None:
+            self._state_json = json.dumps(self.get_state())
+        return self._state_json
+
 
 hardware = Hardware()
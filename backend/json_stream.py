@@ -0,0 +1,54 @@
+import json
+
+
+class RawJson:
+
+    _json: str
+
+    def __init__(self, json_text: str):
+        self._json = json_text
+
+    @property
+    def json(self) -> str:
+        return self._json
+
+
+def iter_json(value):
+    if isinstance(value, RawJson):
+        yield value.json
+    elif isinstance(value, dict):
+        separator = "{"
+        for key, item in value.items():
+            yield separator + json.dumps(str(key)) + ": "
+            yield from iter_json(item)
+            separator = ", "
+        yield "{}" if separator == "{" else "}"
+    elif isinstance(value, (list, tuple)) or _is_iterator(value):
+        separator = "["
+        for item in value:
+            yield separator
+            yield from iter_json(item)
+            separator = ", "
+        yield "[]" if separator == "[" else "]"
+    else:
+        yield json.dumps(value)
+
+
+def _generator():
+    yield
+
+
+# MicroPython generators do not reliably expose __next__
+GENERATOR_TYPE: type = type(_generator())
+
+
+def _is_iterator(value) -> bool:
+    if isinstance(value, GENERATOR_TYPE):
+        return True
+    if value is None or isinstance(value, (str, bytes, bool, int, float)):
+        return False
+    try:
+        iter(value)
+    except TypeError:
+        return False
+    return True
@@ -0,0 +1,144 @@
+import socket
+import json
+from machine import Timer
+from backend.config import config
+from backend.logger import logger
+
+
+log_streams: list['LogStream'] = []
+
+
+class LogStream:
+
+    PERIOD: int = 500
+    QUEUE_SIZE: int = 32
+    REPLAY_BATCH: int = 32
+    KEEP_ALIVE_PERIODS: int = 20
+
+    _socket: socket.socket
+    _level: int
+    _queue: list[tuple | None]
+    _queue_start: int
+    _queue_count: int
+    _dropped: int
+    _last_id: int
+    _replay: object | None
+    _idle_periods: int
+    _closed: bool
+    _timer: Timer
+
+    @classmethod
+    def close_all(cls):
+        for log_stream in log_streams[:]:
+            log_stream.close()
+
+    def __init__(self, socket: socket.socket, level: int, last_id: int):
+        self._socket = socket
+        self._level = level
+        self._queue = [None] * self.QUEUE_SIZE
+        self._queue_start = 0
+        self._queue_count = 0
+        self._dropped = 0
+        self._last_id = last_id
+        self._replay = None
+        self._idle_periods = 0
+        self._closed = False
+        self._timer = Timer()
+
+    def run(self):
+        logger.flush()
+        # the replay is read from flash in batches, live records queue up
+        # meanwhile and are deduplicated by id when sent
+        self._replay = logger.iter_records_after(self._last_id)
+        log_streams.append(self)
+        logger.subscribe(self)
+        self._set_timer()
+        logger.debug("Started log stream", __file__)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._timer.deinit()
+        logger.unsubscribe(self)
+        log_streams.remove(self)
+        self._socket.close()
+
+    def push(self, record: tuple):
+        record_id, _, _, level, _, _ = record
+        if record_id <= self._last_id or logger.LEVELS[level] < self._level:
+            return
+        if self._queue_count == self.QUEUE_SIZE:
+            self._dropped += 1
+            return
+        index = (self._queue_start + self._queue_count) % self.QUEUE_SIZE
+        self._queue[index] = record
+        self._queue_count += 1
+
+    def _set_timer(self):
+        self._timer.init(
+            mode=Timer.ONE_SHOT,
+            period=self.PERIOD,
+            callback=self._timer_callback
+        )
+
+    def _timer_callback(self, _: Timer):
+        try:
+            content = self._event_content()
+            if content:
+                self._socket.send(content)
+        except OSError:
+            self.close()
+        else:
+            if not self._closed:
+                self._set_timer()
+
+    def _record_content(self, record: tuple) -> str:
+        if record[0] <= self._last_id:
+            return ""
+        self._last_id = record[0]
+        return (
+            f"id: {record[0]}\n"
+            + f"data: {json.dumps(logger.structured_record(*record))}\n\n"
+        )
+
+    def _replay_content(self) -> str:
+        content = ""
+        for _ in range(self.REPLAY_BATCH):
+            record = next(self._replay, None)
+            if record is None:
+                self._replay = None
+                break
+            if logger.LEVELS[record[3]] >= self._level:
+                content += self._record_content(record)
+        return content
+
+    def _event_content(self) -> str:
+        if self._replay is not None:
+            content = self._replay_content()
+            if self._replay is not None:
+                self._idle_periods = 0
+                return (
+                    f"retry: {config.event_stream_retry_period}\n" + content
+                )
+        else:
+            content = ""
+        if self._dropped:
+            content += (
+                f"event: dropped\ndata: {json.dumps(self._dropped)}\n\n"
+            )
+            self._dropped = 0
+        while self._queue_count > 0:
+            record = self._queue[self._queue_start]
+            self._queue[self._queue_start] = None
+            self._queue_start = (self._queue_start + 1) % self.QUEUE_SIZE
+            self._queue_count -= 1
+            content += self._record_content(record)
+        if content:
+            self._idle_periods = 0
+            return f"retry: {config.event_stream_retry_period}\n" + content
+        self._idle_periods += 1
+        if self._idle_periods >= self.KEEP_ALIVE_PERIODS:
+            self._idle_periods = 0
+            return ": keep-alive\n\n"
+        return ""
@@ -1,15 +1,84 @@
 import sys
 import os
+import json
+import struct
+from machine import Timer, disable_irq, enable_irq
 from backend import time_util as tu
+from backend.rl_exception import RlException
+from backend.json_stream import iter_json
+
+
+class InvalidLogLevel(RlException):
+    pass
 
 
 class Logger:
 
     TRACEBACK_FILENAME: str = "logs/traceback.txt"
+    INDEX_FILENAME: str = "logs/index.json"
     START: str = ">>>"
     SEP: str = ":::"
 
+    MAGIC: bytes = b"RLG1"
+    # record_length, record_id, ticks_ms, seconds, level_id, module_id
+    RECORD_HEADER_FORMAT: str = "<HIIIBB"
+    RECORD_HEADER_SIZE: int = 16
+    MODULE_DEFINITION: int = 0xFF
+    MAX_MESSAGE_SIZE: int = 0xFFFF - RECORD_HEADER_SIZE + 2
+    NO_MODULE: str = "NO_FILENAME"
+
+    RING_SIZE: int = 64
+    FLUSH_PERIOD: int = 1000
+    FLUSH_GUARD: int = 1000  # milliseconds
+
+    MAX_FILE_SIZE: int = 32 * 1024
+    MAX_FILE_COUNT: int = 10
+    CHECKPOINT_INTERVAL: int = 2 * 1024
+
+    QUERY_LIMIT: int = 100
+
+    DEBUG: int = 10
+    INFO: int = 20
+    WARNING: int = 30
+    ERROR: int = 40
+    EXCEPTION: int = 50
+    LEVELS: dict[str, int] = {
+        'debug': DEBUG,
+        'info': INFO,
+        'warning': WARNING,
+        'error': ERROR,
+        'exception': EXCEPTION
+    }
+    DEFAULT_LEVEL: str = 'info'
+
+    _level: int
+    _module_levels: dict[str, int]
+    _module_names: dict[str, str]
+
     _filename: str
+    _file: object | None
+    _file_modules: dict[str, int]
+    _record_header: bytearray
+    _next_record_id: int
+    _index: dict
+    _current: dict
+
+    _ring_ids: list[int]
+    _ring_ticks: list[int]
+    _ring_seconds: list[int]
+    _ring_levels: list[str | None]
+    _ring_messages: list[str | None]
+    _ring_filenames: list[str | None]
+    _ring_start: int
+    _ring_count: int
+    _dropped: int
+    _flushing: bool
+    _flush_guard: callable | None
+
+    _flush_timer: Timer | None
+
+    _subscribers: list
+    _boot_record_id: int
 
     def get_traceback(self, exception: Exception) -> str:
         with open(self.TRACEBACK_FILENAME, 'w') as file:
@@ -22,62 +91,445 @@ class Logger:
             os.stat("/logs")
         except OSError:
             os.mkdir("/logs")
-        self._set_filename()
+        self._file = None
+        self._file_modules = {}
+        self._record_header = bytearray(self.RECORD_HEADER_SIZE)
+        self._next_record_id = 0
+        self._subscribers = []
+        self._load_index()
+        # record ids continue across boots, so a Last-Event-ID from before
+        # a reboot still points at the right records
+        self._next_record_id = self._recover_next_record_id()
+        self._boot_record_id = self._next_record_id
+        self._start_file()
+
+        self._ring_ids = [0] * self.RING_SIZE
+        self._ring_ticks = [0] * self.RING_SIZE
+        self._ring_seconds = [0] * self.RING_SIZE
+        self._ring_levels = [None] * self.RING_SIZE
+        self._ring_messages = [None] * self.RING_SIZE
+        self._ring_filenames = [None] * self.RING_SIZE
+        self._ring_start = 0
+        self._ring_count = 0
+        self._dropped = 0
+        self._flushing = False
+        self._flush_guard = None
+
+        self._flush_timer = None
+
+        self._level = self.LEVELS[self.DEFAULT_LEVEL]
+        self._module_levels = {}
+        self._module_names = {}
+
+    def _level_value(self, level: str) -> int:
+        try:
+            return self.LEVELS[level]
+        except KeyError:
+            raise InvalidLogLevel(f"unknown log level: {level}")
+
+    def _level_name(self, value: int) -> str:
+        for name, level_value in self.LEVELS.items():
+            if level_value == value:
+                return name
+
+    def _module_name(self, filename: str) -> str:
+        module = self._module_names.get(filename, None)
+        if module is None:
+            module = str(filename).split("/")[-1].split(".")[0]
+            self._module_names[filename] = module
+        return module
+
+    def _enabled(self, level: int, filename: str) -> bool:
+        if self._module_levels:
+            module_level = self._module_levels.get(
+                self._module_name(filename), None
+            )
+            if module_level is not None:
+                return level >= module_level
+        return level >= self._level
+
+    @property
+    def level(self) -> str:
+        return self._level_name(self._level)
+
+    @level.setter
+    def level(self, value: str):
+        self._level = self._level_value(value)
+
+    @property
+    def module_levels(self) -> dict[str, str]:
+        return {
+            module: self._level_name(value)
+            for module, value in self._module_levels.items()
+        }
+
+    def set_module_level(self, module: str, level: str | None):
+        if level is None:
+            self._module_levels.pop(module, None)
+        else:
+            self._module_levels[module] = self._level_value(level)
+
+    def _load_index(self):
+        try:
+            with open(self.INDEX_FILENAME, 'r') as file:
+                self._index = json.load(file)
+            files = self._index['files']
+        except (OSError, ValueError, KeyError):
+            self._index = self._rebuild_index()
+            files = self._index['files']
+        if files:
+            last = files[-1]
+            try:
+                last['size'] = os.stat(self._log_path(last['number']))[6]
+            except OSError:
+                files.pop()
 
-    def _set_filename(self):
-        taken_numbers = [
+    def _rebuild_index(self) -> dict:
+        numbers = sorted(
             int(filename.split(".")[0])
             for filename in os.listdir("/logs")
             if filename.endswith(".log")
-        ] + [-1]
-        number = max(taken_numbers) + 1
-        self._filename = f"logs/{number}.log"
+        )
+        return {
+            'next': numbers[-1] + 1 if numbers else 0,
+            'files': [
+                {
+                    'number': number,
+                    'size': os.stat(self._log_path(number))[6],
+                    'start': None,
+                    'end': None,
+                    'end_id': None,
+                    'offsets': []
+                }
+                for number in numbers
+            ]
+        }
+
+    def _scan_last_record_id(self, number: int) -> int | None:
+        try:
+            file = open(self._log_path(number), 'rb')
+        except OSError:
+            return None
+        last_id = None
+        with file:
+            if file.read(len(self.MAGIC)) != self.MAGIC:
+                return None
+            header = bytearray(self.RECORD_HEADER_SIZE)
+            while file.readinto(header) == self.RECORD_HEADER_SIZE:
+                length, last_id = struct.unpack_from("<HI", header)
+                file.seek(length - self.RECORD_HEADER_SIZE + 2, 1)
+        return last_id
+
+    def _recover_next_record_id(self) -> int:
+        next_id = self._index.get('next_id', None)
+        files = self._index['files']
+        # the index is saved on rotation, only the last file can be newer
+        scanned = files if next_id is None else files[-1:]
+        next_id = next_id or 0
+        for entry in scanned:
+            last_id = self._scan_last_record_id(entry['number'])
+            if last_id is not None:
+                next_id = max(next_id, last_id + 1)
+        return next_id
+
+    def _save_index(self):
+        self._index['next_id'] = self._next_record_id
+        temporary_filename = self.INDEX_FILENAME + ".tmp"
+        with open(temporary_filename, 'w') as file:
+            json.dump(self._index, file)
+        os.rename(temporary_filename, self.INDEX_FILENAME)
+
+    def _log_path(self, number: int) -> str:
+        return f"logs/{number}.log"
+
+    def _start_file(self):
+        number = self._index['next']
+        self._index['next'] = number + 1
+        self._current = {
+            'number': number,
+            'size': 0,
+            'start': None,
+            'end': None,
+            'end_id': None,
+            'offsets': []
+        }
+        self._index['files'].append(self._current)
+        self._filename = self._log_path(number)
+        self._prune()
+        self._save_index()
+
+    def _prune(self):
+        files = self._index['files']
+        while len(files) > self.MAX_FILE_COUNT:
+            entry = files.pop(0)
+            try:
+                os.remove(self._log_path(entry['number']))
+            except OSError:
+                pass
+
+    def _rotate(self):
+        self._close_file()
+        self._start_file()
+        self._open_file()
+
+    def _log(
+        self, level: str, message: str, filename: str, args: tuple = ()
+    ):
+        if args:
+            message = message.format(*args)
+        ticks = tu.ticks_ms()
+        seconds = tu.system_seconds()
+        # timer callbacks log too, keep them out while the ring changes
+        irq_state = disable_irq()
+        try:
+            if self._ring_count == self.RING_SIZE:
+                self._ring_start = (self._ring_start + 1) % self.RING_SIZE
+                self._ring_count -= 1
+                self._dropped += 1
+            index = (self._ring_start + self._ring_count) % self.RING_SIZE
+            self._ring_ids[index] = self._next_record_id
+            self._next_record_id += 1
+            self._ring_ticks[index] = ticks
+            self._ring_seconds[index] = seconds
+            self._ring_levels[index] = level
+            self._ring_messages[index] = message
+            self._ring_filenames[index] = filename
+            self._ring_count += 1
+            if self._subscribers:
+                self._notify(index, self._subscribers)
+        finally:
+            enable_irq(irq_state)
 
-    def _log(self, level: str, message: str, filename: str):
-        time_string = tu.get_system_time().split(".")[0]
+    def _ring_record(self, index: int) -> tuple:
+        return (
+            self._ring_ids[index],
+            self._ring_ticks[index],
+            self._ring_seconds[index],
+            self._ring_levels[index],
+            self._ring_messages[index],
+            self._ring_filenames[index]
+        )
+
+    def _notify(self, index: int, subscribers: list):
+        record_id, ticks, seconds, level, message, filename = (
+            self._ring_record(index)
+        )
+        record = (
+            record_id, ticks, seconds, level,
+            self.NO_MODULE if filename is None else (
+                self._module_name(filename)
+            ),
+            message
+        )
+        for subscriber in subscribers:
+            subscriber.push(record)
+
+    def _pop_record(self) -> tuple | None:
+        irq_state = disable_irq()
+        try:
+            if self._ring_count == 0:
+                return None
+            index = self._ring_start
+            record = self._ring_record(index)
+            self._ring_messages[index] = None
+            self._ring_start = (index + 1) % self.RING_SIZE
+            self._ring_count -= 1
+            return record
+        finally:
+            enable_irq(irq_state)
+
+    def _pop_dropped(self) -> tuple[int, int]:
+        irq_state = disable_irq()
+        try:
+            dropped, self._dropped = self._dropped, 0
+            if not dropped:
+                return 0, 0
+            record_id = self._next_record_id
+            self._next_record_id += 1
+            return dropped, record_id
+        finally:
+            enable_irq(irq_state)
+
+    def _format_entry(
+        self, seconds: int, level: str, message: str, filename: str
+    ) -> str:
+        time_string = tu.get_system_time(seconds).split(".")[0]
         time_string = time_string.replace("T", " ").replace(":", ".")
         if filename is None:
             filename = "NO_FILENAME"
-        log_entry = (
+        return (
             f"{self.START}{time_string}{self.SEP}{level}"
             + f"{self.SEP}main_thread"
             + f"{self.SEP}{filename}{self.SEP}NO_LINE{self.SEP}{message}"
         )
-        print(log_entry)
+
+    def _open_file(self):
+        self._file = open(self._filename, 'ab')
+        if self._current['size'] == 0:
+            self._current['size'] = self._file.write(self.MAGIC)
+            self._file_modules = {}
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_record(
+        self,
+        record_id: int,
+        ticks: int,
+        seconds: int,
+        level_id: int,
+        module_id: int,
+        message: bytes
+    ):
+        if len(message) > self.MAX_MESSAGE_SIZE:
+            end = self.MAX_MESSAGE_SIZE
+            # never cut a multibyte utf-8 sequence in half
+            while end > 0 and message[end] & 0xC0 == 0x80:
+                end -= 1
+            message = message[:end]
+        struct.pack_into(
+            self.RECORD_HEADER_FORMAT, self._record_header, 0,
+            self.RECORD_HEADER_SIZE - 2 + len(message),
+            record_id, ticks, seconds, level_id, module_id
+        )
+        self._file.write(self._record_header)
+        self._file.write(message)
+        self._current['size'] += self.RECORD_HEADER_SIZE + len(message)
+
+    def _module_id(self, module: str, record_id: int, ticks: int) -> int:
+        module_id = self._file_modules.get(module, None)
+        if module_id is None:
+            module_id = len(self._file_modules)
+            self._file_modules[module] = module_id
+            self._write_record(
+                record_id, ticks, 0, self.MODULE_DEFINITION, module_id,
+                module.encode('utf-8')
+            )
+        return module_id
+
+    def _write_entry(
+        self,
+        record_id: int,
+        ticks: int,
+        seconds: int,
+        level: str,
+        message: str,
+        filename: str
+    ):
+        module = self.NO_MODULE if filename is None else (
+            self._module_name(filename)
+        )
+        print(self._format_entry(seconds, level, message, module))
+        offsets = self._current['offsets']
+        if self._current['size'] >= (
+            (len(offsets) + 1) * self.CHECKPOINT_INTERVAL
+        ):
+            offsets.append([seconds, self._current['size']])
+            self._file_modules = {}
+        self._write_record(
+            record_id, ticks, seconds, self.LEVELS[level] // 10,
+            self._module_id(module, record_id, ticks),
+            message.encode('utf-8')
+        )
+        if self._current['start'] is None:
+            self._current['start'] = seconds
+        self._current['end'] = seconds
+        self._current['end_id'] = record_id
+        if self._current['size'] >= self.MAX_FILE_SIZE:
+            self._rotate()
+
+    def guard_flush(self, milliseconds_to_next: callable | None):
+        # flash writes stall the timers, so they only happen in the gaps
+        # between the cues of a scheduled or running show
+        self._flush_guard = milliseconds_to_next
+
+    def _flush_allowed(self) -> bool:
+        if self._flush_guard is None:
+            return True
+        milliseconds_left = self._flush_guard()
+        return (
+            milliseconds_left is None
+            or milliseconds_left > self.FLUSH_GUARD
+        )
+
+    def flush(self, force: bool = False):
+        if self._flushing or (
+            self._ring_count == 0 and not self._dropped
+        ) or not (force or self._flush_allowed()):
+            return
+        self._flushing = True
         try:
-            with open(self._filename, 'a', encoding='utf-8') as file:
-                file.write(f"{log_entry}\n")
-        except OSError:
-            with open(self._filename, 'w', encoding='utf-8') as file:
-                file.write(f"{log_entry}\n")
+            if self._file is None:
+                self._open_file()
+            dropped, record_id = self._pop_dropped()
+            if dropped:
+                self._write_entry(
+                    record_id, tu.ticks_ms(), tu.system_seconds(),
+                    'warning', f"Dropped {dropped} log records", __file__
+                )
+            record = self._pop_record()
+            while record is not None:
+                self._write_entry(*record)
+                record = self._pop_record()
+            self._file.flush()
+        finally:
+            self._flushing = False
+
+    def start_flush_timer(self):
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = Timer()
+        self._flush_timer.init(
+            mode=Timer.PERIODIC,
+            period=self.FLUSH_PERIOD,
+            callback=lambda _: self.flush()
+        )
+
+    def close(self):
+        if self._flush_timer is not None:
+            self._flush_timer.deinit()
+            self._flush_timer = None
+        self.flush(force=True)
+        self._close_file()
+        self._save_index()
 
     def debug(
         self,
         message: str,
-        filename: str = None
+        filename: str = None,
+        *args
     ):
-        self._log('debug', message, filename)
+        if self._enabled(self.DEBUG, filename):
+            self._log('debug', message, filename, args)
 
     def info(
         self,
         message: str,
-        filename: str = None
+        filename: str = None,
+        *args
     ):
-        self._log('info', message, filename)
+        if self._enabled(self.INFO, filename):
+            self._log('info', message, filename, args)
 
     def warning(
         self,
         message: str,
-        filename: str = None
+        filename: str = None,
+        *args
     ):
-        self._log('warning', message, filename)
+        if self._enabled(self.WARNING, filename):
+            self._log('warning', message, filename, args)
 
     def error(
         self,
         message: str,
-        filename: str = None
+        filename: str = None,
+        *args
     ):
-        self._log('error', message, filename)
+        if self._enabled(self.ERROR, filename):
+            self._log('error', message, filename, args)
 
     def exception(
         self,
@@ -85,52 +537,236 @@ class Logger:
         exception: Exception,
         filename: str = None
     ):
+        if not self._enabled(self.EXCEPTION, filename):
+            return
         traceback = self.get_traceback(exception)
         self._log(
             'exception',
             "\n".join([message, traceback]),
             filename
         )
+        self.flush()
+
+    def subscribe(self, subscriber):
+        # subscribers get records as they enter the ring, starting with
+        # the ones not flushed yet
+        irq_state = disable_irq()
+        try:
+            self._subscribers.append(subscriber)
+            for i in range(self._ring_count):
+                self._notify(
+                    (self._ring_start + i) % self.RING_SIZE, (subscriber,)
+                )
+        finally:
+            enable_irq(irq_state)
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+
+    @property
+    def boot_record_id(self) -> int:
+        return self._boot_record_id
+
+    def iter_records_after(self, after_id: int):
+        for entry in list(self._index['files']):
+            end_id = entry.get('end_id', None)
+            if end_id is not None and end_id <= after_id:
+                continue
+            for record in self.iter_log_records(f"{entry['number']}.log"):
+                if record[0] > after_id:
+                    yield record
+
+    def level_value(self, level: str) -> int:
+        return self._level_value(level)
 
     def get_log_files(self) -> list[str]:
-        return [
-            filename for filename
-            in os.listdir("logs")
-            if filename.endswith(".log")
-        ]
+        return [f"{entry['number']}.log" for entry in self._index['files']]
 
-    def get_log_file_content(self, name: str) -> str:
-        with open(f"logs/{name}", 'r', encoding='utf-8') as file:
-            return file.read()
+    def get_log_index(self) -> list[dict]:
+        return self._index['files']
 
-    def get_log_structured_content(self, name: str) -> list[dict[str, str]]:
-        content = self.get_log_file_content(name).replace("\n", "")
-        structured_content = []
-        for line in content.split(self.START)[1:]:
-            time, level, thread, file, lineno, message = line.split(self.SEP)
-            structured_content.append({
-                'time': time,
-                'level': level,
-                'thread': thread,
-                'file': file,
-                'line': lineno,
-                'message': message
-            })
-        return structured_content
+    def get_log_file_path(self, name: str) -> str:
+        return f"logs/{name}"
 
-    def logfile_exists(self, name: str) -> bool:
+    def iter_log_records(self, name: str, offset: int = None):
         try:
-            with open(f"logs/{name}", 'r') as _:
-                return True
+            file = open(self.get_log_file_path(name), 'rb')
         except OSError:
-            return False
+            return
+        with file:
+            if file.read(len(self.MAGIC)) != self.MAGIC:
+                return
+            if offset is not None:
+                file.seek(offset)
+            modules = {}
+            header = bytearray(self.RECORD_HEADER_SIZE)
+            while file.readinto(header) == self.RECORD_HEADER_SIZE:
+                (
+                    length, record_id, ticks, seconds, level_id, module_id
+                ) = struct.unpack(self.RECORD_HEADER_FORMAT, header)
+                message = file.read(length - self.RECORD_HEADER_SIZE + 2)
+                if level_id == self.MODULE_DEFINITION:
+                    modules[module_id] = self._decode(message)
+                    continue
+                yield (
+                    record_id,
+                    ticks,
+                    seconds,
+                    self._level_name(level_id * 10),
+                    modules.get(module_id, self.NO_MODULE),
+                    self._decode(message)
+                )
+
+    def _decode(self, message: bytes) -> str:
+        try:
+            return message.decode('utf-8')
+        except UnicodeError:
+            # records cut by older firmware, keep the rest of the log
+            return "".join(
+                chr(byte) if byte < 0x80 else "?" for byte in message
+            )
+
+    def iter_log_text(self, name: str):
+        for _, _, seconds, level, module, message in (
+            self.iter_log_records(name)
+        ):
+            yield self._format_entry(seconds, level, message, module) + "\n"
+
+    def structured_record(
+        self,
+        record_id: int,
+        ticks: int,
+        seconds: int,
+        level: str,
+        module: str,
+        message: str
+    ) -> dict:
+        time_string = tu.get_system_time(seconds).split(".")[0]
+        return {
+            'id': record_id,
+            'ticks': ticks,
+            'seconds': seconds,
+            'time': time_string.replace("T", " ").replace(":", "."),
+            'level': level,
+            'thread': 'main_thread',
+            'file': module,
+            'line': 'NO_LINE',
+            'message': message
+        }
+
+    def iter_log_structured(self, name: str):
+        return iter_json(
+            self.structured_record(*record)
+            for record in self.iter_log_records(name)
+        )
+
+    def _checkpoint_offset(self, entry: dict, since: int | None) -> int:
+        offset = None
+        if since is not None:
+            for seconds, checkpoint_offset in entry.get('offsets', ()):
+                if seconds > since:
+                    break
+                offset = checkpoint_offset
+        return offset
+
+    def _iter_query_records(
+        self,
+        name: str | None,
+        level: str | None,
+        module: str | None,
+        since: int | None,
+        until: int | None,
+        text: str | None,
+        offset: int,
+        limit: int
+    ):
+        level_value = 0 if level is None else self._level_value(level)
+        skipped = 0
+        emitted = 0
+        if limit <= 0:
+            return
+        for entry in list(self._index['files']):
+            filename = f"{entry['number']}.log"
+            if name is not None and filename != name:
+                continue
+            if since is not None and entry['end'] is not None and (
+                entry['end'] < since
+            ):
+                continue
+            if until is not None and entry['start'] is not None and (
+                entry['start'] > until
+            ):
+                continue
+            for record in self.iter_log_records(
+                filename, self._checkpoint_offset(entry, since)
+            ):
+                _, _, seconds, record_level, record_module, message = record
+                if until is not None and seconds > until:
+                    break
+                if since is not None and seconds < since:
+                    continue
+                if self.LEVELS.get(record_level, 0) < level_value:
+                    continue
+                if module is not None and record_module != module:
+                    continue
+                if text is not None and text not in message:
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                yield self.structured_record(*record)
+                emitted += 1
+                if emitted >= limit:
+                    return
+
+    def iter_log_query(
+        self,
+        name: str = None,
+        level: str = None,
+        module: str = None,
+        since: int = None,
+        until: int = None,
+        text: str = None,
+        offset: int = 0,
+        limit: int = QUERY_LIMIT
+    ):
+        if level is not None:
+            self._level_value(level)
+        return iter_json(self._iter_query_records(
+            name, level, module, since, until, text, offset, limit
+        ))
+
+    def _index_entry(self, name: str) -> dict | None:
+        for entry in self._index['files']:
+            if f"{entry['number']}.log" == name:
+                return entry
+        return None
+
+    def logfile_exists(self, name: str) -> bool:
+        return self._index_entry(name) is not None
 
     def delete_all_logfiles(self):
         for filename in self.get_log_files():
             self.delete_logfile(filename)
 
     def delete_logfile(self, filename: str):
-        os.remove(f"logs/{filename}")
+        entry = self._index_entry(filename)
+        path = self.get_log_file_path(filename)
+        if entry is self._current:
+            self.flush()
+            self._close_file()
+            self._current['size'] = 0
+            self._current['start'] = None
+            self._current['end'] = None
+            self._current['offsets'] = []
+        elif entry is not None:
+            self._index['files'].remove(entry)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self._save_index()
 
 
 logger = Logger()
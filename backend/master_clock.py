@@ -0,0 +1,62 @@
+from backend import time_util as tu
+from backend.config import config
+from backend.logger import logger
+from backend.ntp_client import NtpClient, ntp_client
+
+
+class MasterClock(NtpClient):
+
+    # The master answers NTP-format requests on this port, so the same
+    # four-timestamp exchange works on show sites without internet access.
+    PORT: int = 12300
+    SAMPLES: int = 3
+    TIMEOUT: float = 0.2  # seconds
+    # a blocking exchange would delay the cue timer, the remotes catch up
+    # with the master after the show
+    SYNC_WHILE_HELD: bool = False
+    SCHEDULE_GUARD: int = 2000  # milliseconds
+    SYNC_PERIOD: int = 5000
+    MAX_FAILURES: int = 3
+
+    _failures: int
+    _synced: bool
+
+    def __init__(self):
+        super().__init__(host=None, port=self.PORT)
+        self._failures = 0
+        self._synced = False
+
+    def _server_address(self):
+        if config.master_ip is None:
+            return None
+        return (config.master_ip, self._port)
+
+    def _finish_sync(self) -> bool:
+        if not super()._finish_sync():
+            return False
+        self._failures = 0
+        if not self._synced:
+            logger.info("Following master clock", __file__)
+            self._synced = True
+            ntp_client.suspend(True)
+        return True
+
+    def _report_failure(self):
+        self._failures += 1
+        if self._synced and self._failures >= self.MAX_FAILURES:
+            logger.warning("Lost master clock", __file__)
+            self._synced = False
+            self._version += 1
+            ntp_client.suspend(False)
+
+    def get_state(self) -> dict:
+        if self._synced:
+            state = super().get_state()
+            state['source'] = 'master'
+        else:
+            state = ntp_client.get_state()
+            state['source'] = 'ntp' if tu.clock_synced() else None
+        return state
+
+
+master_clock = MasterClock()
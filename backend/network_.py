@@ -1,5 +1,6 @@
 import network
 import json
+import socket
 from backend import time_util as tu
 from backend.hardware import hardware
 
@@ -51,3 +52,15 @@ class Network:
     @classmethod
     def ip(cls) -> str:
         return cls._ip
+
+    @classmethod
+    def join_multicast_group(cls, sock: socket.socket, group: str):
+        sock.setsockopt(
+            socket.IPPROTO_IP,
+            socket.IP_ADD_MEMBERSHIP,
+            cls._address_bytes(group) + cls._address_bytes(cls._ip)
+        )
+
+    @classmethod
+    def _address_bytes(cls, address: str) -> bytes:
+        return bytes(int(part) for part in address.split("."))
@@ -0,0 +1,237 @@
+import socket
+from machine import Timer
+from backend import time_util as tu
+from backend import ntp_packet
+from backend.logger import logger
+from backend.schedule import Schedule
+
+
+class NtpClient:
+
+    HOST: str = "pool.ntp.org"
+    PORT: int = 123
+    SAMPLES: int = 4
+    TIMEOUT: float = 0.5  # seconds
+    SAMPLE_PERIOD: int = 1000  # milliseconds between timer samples
+    SYNC_WHILE_HELD: bool = False
+    # no syncs this close to an armed schedule, None for any armed schedule
+    SCHEDULE_GUARD: int | None = None  # milliseconds
+    CHANGE_THRESHOLD: int = 5  # milliseconds
+    SYNC_PERIOD: int = 3600000  # 1 hour
+    MIN_DRIFT_INTERVAL: int = 600000  # 10 minutes
+    MAX_DRIFT_INTERVAL: int = 1 << 28  # milliseconds
+
+    _host: str
+    _port: int
+    _address: tuple | None
+    _timer: Timer
+    _packet: bytearray
+    _offset: int | None
+    _delay: int | None
+    _drift_ticks: int | None
+    _drift_residual: int
+    _suspended: bool
+    _version: int
+    _best: tuple | None
+    _samples_taken: int
+
+    def __init__(self, host: str = HOST, port: int = PORT):
+        self._host = host
+        self._port = port
+        self._address = None
+        self._timer = Timer()
+        self._packet = bytearray(ntp_packet.PACKET_SIZE)
+        self._offset = None
+        self._delay = None
+        self._drift_ticks = None
+        self._drift_residual = 0
+        self._suspended = False
+        self._version = 0
+        self._best = None
+        self._samples_taken = 0
+
+    def start_sync_timer(self):
+        self._set_timer(self.SYNC_PERIOD)
+
+    def _set_timer(self, period: int):
+        self._timer.init(
+            mode=Timer.ONE_SHOT,
+            period=period,
+            callback=self._timer_callback
+        )
+
+    def _server_address(self):
+        # resolved once, a dns lookup blocks until the server answers
+        if self._address is None:
+            self._address = socket.getaddrinfo(self._host, self._port)[0][-1]
+        return self._address
+
+    def sync(self) -> bool:
+        self._reset_samples()
+        for _ in range(self.SAMPLES):
+            if not self._take_sample():
+                self._reset_samples()
+                return False
+        return self._finish_sync()
+
+    def _reset_samples(self):
+        self._best = None
+        self._samples_taken = 0
+
+    def _take_sample(self) -> bool:
+        try:
+            address = self._server_address()
+            if address is None:
+                return False
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        except OSError as ex:
+            logger.exception("Could not reach time server", ex, __file__)
+            return False
+        try:
+            sock.settimeout(self.TIMEOUT)
+            sample = self._sample(sock, address)
+        except OSError:
+            sample = None
+        finally:
+            sock.close()
+        self._samples_taken += 1
+        if sample is not None and (
+            self._best is None or sample[1] < self._best[1]
+        ):
+            self._best = sample
+        return True
+
+    def _finish_sync(self) -> bool:
+        best = self._best
+        self._reset_samples()
+        if best is None:
+            # the next sync looks the host up again
+            self._address = None
+            self._report_failure()
+            return False
+        self._apply(*best)
+        return True
+
+    def _sample(self, sock: socket.socket, address) -> tuple | None:
+        cookie = tu.ticks_ms()
+        ntp_packet.prepare_request(self._packet, cookie)
+        originate = tu.timestamp_now()
+        sock.sendto(self._packet, address)
+        response = sock.recv(ntp_packet.PACKET_SIZE)
+        destination = tu.timestamp_now()
+        return ntp_packet.offset_and_delay(
+            response, cookie, originate, destination, tu.TIMEZONE_OFFSET
+        )
+
+    def _report_failure(self):
+        logger.warning("No usable ntp samples", __file__)
+
+    def _estimate_drift(self, offset: int) -> int | None:
+        ticks = tu.ticks_ms()
+        if self._drift_ticks is None:
+            self._drift_ticks = ticks
+            self._drift_residual = 0
+            return None
+        # the part of the offset not explained by the pending slew was
+        # accumulated by drift since the last sync
+        self._drift_residual += offset - tu.pending_slew()
+        interval = tu.ticks_diff(ticks, self._drift_ticks)
+        if interval < self.MIN_DRIFT_INTERVAL:
+            return None
+        self._drift_ticks = ticks
+        residual = self._drift_residual
+        self._drift_residual = 0
+        if interval > self.MAX_DRIFT_INTERVAL:
+            return None
+        # only correct half of the observed error to damp noise
+        return tu.clock_drift() + residual * 1000000000 // interval // 2
+
+    def _changed(self, offset: int, delay: int) -> bool:
+        return (
+            self._offset is None
+            or abs(offset - self._offset) >= self.CHANGE_THRESHOLD
+            or abs(delay - self._delay) >= 2 * self.CHANGE_THRESHOLD
+        )
+
+    def _apply(self, offset: int, delay: int):
+        drift = tu.clock_drift()
+        stepped = tu.adjust_clock(offset, self._estimate_drift(offset))
+        if stepped:
+            self._drift_ticks = None
+            logger.info("Clock stepped by {} ms", __file__, offset)
+        logger.debug(
+            "Clock {} by {} ms (delay {} ms, drift {} ppb)", __file__,
+            "stepped" if stepped else "slewed", offset, delay,
+            tu.clock_drift()
+        )
+        # the state feeds the /state ETag, so it only changes noticeably
+        if stepped or drift != tu.clock_drift() or self._changed(
+            offset, delay
+        ):
+            self._offset = offset
+            self._delay = delay
+            self._version += 1
+
+    def suspend(self, suspended: bool):
+        self._suspended = suspended
+
+    def _sync_allowed(self) -> bool:
+        if self._suspended or (
+            tu.clock_held() and not self.SYNC_WHILE_HELD
+        ):
+            return False
+        # a blocking sync would delay the timer of an armed schedule
+        milliseconds_left = Schedule.milliseconds_to_next()
+        return milliseconds_left is None or (
+            self.SCHEDULE_GUARD is not None
+            and milliseconds_left > self.SCHEDULE_GUARD
+        )
+
+    def _timer_callback(self, _: Timer):
+        # one sample per callback, so a sync never blocks the webserver
+        # and the other timers for more than a single timeout
+        period = self.SYNC_PERIOD
+        try:
+            if not self._sync_allowed() or not self._take_sample():
+                self._reset_samples()
+            elif self._samples_taken < self.SAMPLES:
+                period = self.SAMPLE_PERIOD
+            else:
+                self._finish_sync()
+        except Exception as ex:
+            self._reset_samples()
+            logger.exception("Exception while syncing time", ex, __file__)
+        finally:
+            self._set_timer(period)
+
+    @property
+    def offset(self) -> int | None:
+        return self._offset
+
+    @property
+    def delay(self) -> int | None:
+        return self._delay
+
+    @property
+    def error(self) -> int | None:
+        if self._delay is None:
+            return None
+        return max(self._delay, 0) // 2 + 1
+
+    @property
+    def suspended(self) -> bool:
+        return self._suspended
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get_state(self) -> dict:
+        return {
+            'offset': self._offset,
+            'error': self.error,
+            'drift': tu.clock_drift()
+        }
+
+
+ntp_client = NtpClient()
@@ -0,0 +1,41 @@
+import struct
+
+
+NTP_DELTA: int = 2208988800  # 1900-01-01 to 1970-01-01
+PACKET_SIZE: int = 48
+
+
+def prepare_request(packet: bytearray, cookie: int):
+    for i in range(PACKET_SIZE):
+        packet[i] = 0
+    packet[0] = 0x23  # leap indicator 0, version 4, client mode
+    # the server echoes the transmit field as originate
+    struct.pack_into("!II", packet, 40, cookie, cookie)
+
+
+def timestamp(packet: bytes, position: int, timezone_offset: int = 0) -> int:
+    seconds, fraction = struct.unpack_from("!II", packet, position)
+    return (
+        (seconds - NTP_DELTA + timezone_offset) * 1000
+        + ((fraction * 1000) >> 32)
+    )
+
+
+def offset_and_delay(
+    response: bytes,
+    cookie: int,
+    originate: int,
+    destination: int,
+    timezone_offset: int = 0
+) -> tuple | None:
+    if (
+        len(response) < PACKET_SIZE
+        or response[0] & 0x07 != 4
+        or struct.unpack_from("!II", response, 24) != (cookie, cookie)
+    ):
+        return None
+    receive = timestamp(response, 32, timezone_offset)
+    transmit = timestamp(response, 40, timezone_offset)
+    offset = ((receive - originate) + (transmit - destination)) // 2
+    delay = (destination - originate) - (transmit - receive)
+    return offset, delay
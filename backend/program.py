@@ -1,7 +1,11 @@
+import json
+import struct
+import binascii
 from backend.command import Command
 from backend.rl_exception import RlException
 from backend.config import config
 from backend.address import Address
+from backend.json_stream import iter_json, RawJson
 import backend.time_util as tu
 from machine import Timer
 from backend.logger import logger
@@ -12,6 +16,19 @@ class Program:
     class InvalidProgram(RlException):
         pass
 
+    class UnknownCommand(RlException):
+        pass
+
+    BINARY_MAGIC: bytes = b"RLP1"
+    BINARY_VERSION: int = 1
+    # magic, version, flags, cue count, crc32 of everything after the header
+    BINARY_HEADER_FORMAT: str = "<4sBBHI"
+    BINARY_HEADER_SIZE: int = struct.calcsize(BINARY_HEADER_FORMAT)
+    # timestamp in ms, fuse index (letter index * 16 + number)
+    BINARY_RECORD_FORMAT: str = "<IH"
+    BINARY_RECORD_SIZE: int = struct.calcsize(BINARY_RECORD_FORMAT)
+    BINARY_FLAG_NAMES: int = 0x01
+
     _name: str
     _command_list: list[Command]
 
@@ -33,23 +50,126 @@ class Program:
 
     _timer: Timer
 
+    _version: int
+    _command_list_json: str | None
+    _command_list_json_version: int
+    _fired_count_value: int
+    _fired_count_version: int
+    _next_command_id: int
+    _commands_by_id: dict[int, Command]
+    _removed_commands: list[tuple[int, int]]
+
     @classmethod
-    def from_json(cls, name: str, json_data: list) -> 'Program':
+    def from_json(
+        cls, name: str, json_data: list, device_id: str = None
+    ) -> 'Program':
         program = cls(name)
         for event in json_data:
+            command = cls._command_from_event(event, device_id)
+            if command is not None:
+                program.add_command(command)
+        return program
+
+    @classmethod
+    def _check_address(cls, address: Address):
+        if (
+            address.letter != Address.LETTER
+            or not 0 <= address.number < config.fuse_amount
+        ):
+            raise cls.InvalidProgram(f"no such fuse on this device: {address}")
+
+    @classmethod
+    def _command_from_event(
+        cls, event: dict, device_id: str | None
+    ) -> Command | None:
+        try:
+            event_device_id = event.get('device_id', device_id)
+            if event_device_id is None:
+                raise cls.InvalidProgram(
+                    f"event without device_id: {event['name']}"
+                )
             address = Address(
-                event['device_id'],
-                event['letter'],
-                event['number']
+                str(event_device_id),
+                str(event['letter']),
+                int(event['number'])
             )
-            if address.device_id != config.device_id:
-                continue
-            command = Command(
-                address,
-                int(float(event['timestamp']) * 1000),
-                event['name']
+            timestamp = int(float(event['timestamp']) * 1000)
+            name = str(event['name'])
+        except (KeyError, ValueError, TypeError, AttributeError):
+            raise cls.InvalidProgram(f"invalid event: {event}")
+        if address.device_id != config.device_id:
+            return None
+        cls._check_address(address)
+        return Command(address, timestamp, name)
+
+    @classmethod
+    def _read_binary_string(cls, data: bytes, position: int) -> tuple:
+        end = position + 1 + data[position]
+        if end > len(data):
+            raise cls.InvalidProgram("binary program truncated")
+        return str(data[position + 1:end], 'utf-8'), end
+
+    @classmethod
+    def is_binary(cls, data: bytes) -> bool:
+        return data[:len(cls.BINARY_MAGIC)] == cls.BINARY_MAGIC
+
+    @classmethod
+    def read_binary_header(cls, data: bytes) -> tuple:
+        if len(data) < cls.BINARY_HEADER_SIZE:
+            raise cls.InvalidProgram("binary program truncated")
+        magic, version, flags, cue_count, checksum = struct.unpack_from(
+            cls.BINARY_HEADER_FORMAT, data, 0
+        )
+        if magic != cls.BINARY_MAGIC:
+            raise cls.InvalidProgram("not a binary program")
+        if version != cls.BINARY_VERSION:
+            raise cls.InvalidProgram(
+                f"unsupported binary program version: {version}"
+            )
+        view = memoryview(data)
+        if binascii.crc32(view[cls.BINARY_HEADER_SIZE:]) != checksum:
+            raise cls.InvalidProgram("binary program checksum mismatch")
+        try:
+            name, position = cls._read_binary_string(
+                data, cls.BINARY_HEADER_SIZE
             )
-            program.add_command(command)
+            device_id, position = cls._read_binary_string(data, position)
+        except (IndexError, UnicodeError):
+            raise cls.InvalidProgram("binary program header corrupt")
+        if position + cue_count * cls.BINARY_RECORD_SIZE > len(data):
+            raise cls.InvalidProgram("binary program truncated")
+        return name, device_id, flags, cue_count, position
+
+    @classmethod
+    def from_binary(cls, data: bytes, header: tuple = None) -> 'Program':
+        if header is None:
+            header = cls.read_binary_header(data)
+        name, device_id, flags, cue_count, position = header
+        names_position = position + cue_count * cls.BINARY_RECORD_SIZE
+        program = cls(name)
+        try:
+            for _ in range(cue_count):
+                timestamp, fuse_index = struct.unpack_from(
+                    cls.BINARY_RECORD_FORMAT, data, position
+                )
+                position += cls.BINARY_RECORD_SIZE
+                address = Address(
+                    device_id,
+                    Address.ASCII_LOWERCASE[
+                        fuse_index // Address.NUMBERS_PER_LETTER
+                    ],
+                    fuse_index % Address.NUMBERS_PER_LETTER
+                )
+                cls._check_address(address)
+                if flags & cls.BINARY_FLAG_NAMES:
+                    command_name, names_position = cls._read_binary_string(
+                        data, names_position
+                    )
+                else:
+                    command_name = str(address)
+                program.add_command(Command(address, timestamp, command_name))
+        except (IndexError, UnicodeError):
+            raise cls.InvalidProgram("binary program records corrupt")
         return program
 
     @classmethod
@@ -83,15 +203,121 @@ class Program:
 
         self._timer = Timer()
 
-    def add_command(self, command: Command):
-        self._command_list.append(command)
+        self._version = 0
+        self._command_list_json = None
+        self._command_list_json_version = -1
+        self._fired_count_value = 0
+        self._fired_count_version = -1
+        self._next_command_id = 0
+        self._commands_by_id = {}
+        self._removed_commands = []
+
+    def _bump_version(self):
+        self._version += 1
+
+    def _command_state_changed(self, command: Command):
+        self._bump_version()
+        command.changed_version = self._version
+
+    def _bisect(self, timestamp: int, after_equal: bool) -> int:
+        low = 0
+        high = len(self._command_list)
+        while low < high:
+            middle = (low + high) // 2
+            middle_timestamp = self._command_list[middle].timestamp
+            if middle_timestamp < timestamp or (
+                after_equal and middle_timestamp == timestamp
+            ):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _insert_command(self, command: Command):
+        if (
+            not self._command_list
+            or self._command_list[-1].timestamp <= command.timestamp
+        ):
+            self._command_list.append(command)
+        else:
+            self._command_list.insert(
+                self._bisect(command.timestamp, True), command
+            )
 
-    def run(self, callback: callable):
-        self._start_timestamp = tu.timestamp_now()
+    def _remove_command(self, command: Command):
+        index = self._bisect(command.timestamp, False)
+        while self._command_list[index] is not command:
+            index += 1
+        del self._command_list[index]
+
+    def add_command(self, command: Command):
+        command.id = self._next_command_id
+        self._next_command_id += 1
+        command.set_state_listener(self._command_state_changed)
+        self._insert_command(command)
+        self._commands_by_id[command.id] = command
+        self._command_state_changed(command)
+
+    def _get_command(self, command_id) -> Command:
+        try:
+            return self._commands_by_id[int(command_id)]
+        except (KeyError, ValueError, TypeError):
+            raise self.UnknownCommand(f"unknown command id: {command_id}")
+
+    def patch(self, add: list, remove: list, retime: list) -> list[int]:
+        for changes in (add, remove, retime):
+            if not isinstance(changes, list):
+                raise self.InvalidProgram(
+                    f"changes have to be a list: {changes}"
+                )
+        removed = [self._get_command(command_id) for command_id in remove]
+        retimed = []
+        for change in retime:
+            try:
+                command_id = change['id']
+                timestamp = int(float(change['timestamp']) * 1000)
+            except (KeyError, ValueError, TypeError):
+                raise self.InvalidProgram(f"invalid retime: {change}")
+            retimed.append((self._get_command(command_id), timestamp))
+        changed_ids = [command.id for command in removed] + [
+            command.id for command, _ in retimed
+        ]
+        if len(set(changed_ids)) != len(changed_ids):
+            raise self.InvalidProgram(
+                f"command ids changed more than once: {changed_ids}"
+            )
+        added = []
+        for event in add:
+            command = self._command_from_event(event, config.device_id)
+            if command is None:
+                raise self.InvalidProgram(
+                    f"event for another device: {event['name']}"
+                )
+            added.append(command)
+
+        for command in removed:
+            self._remove_command(command)
+            del self._commands_by_id[command.id]
+            command.set_state_listener(None)
+            self._bump_version()
+            self._removed_commands.append((command.id, self._version))
+        for command, timestamp in retimed:
+            self._remove_command(command)
+            command.set_timestamp(timestamp)
+            self._insert_command(command)
+        for command in added:
+            self.add_command(command)
+        return [command.id for command in added]
+
+    def run(self, callback: callable, start_timestamp: int = None):
+        self._start_timestamp = (
+            tu.timestamp_now() if start_timestamp is None else start_timestamp
+        )
         self._milliseconds_paused = 0
         self._command_index = 0
         self._running = True
         self._callback = callback
+        self._bump_version()
 
         self._timer.init(
             mode=Timer.ONE_SHOT,
@@ -113,13 +339,20 @@ class Program:
         while self._running:
             tu.sleep(config.time_resolution / 1000)
 
-    def get_state(self) -> dict:
+    def _fired_count(self) -> int:
+        if self._fired_count_version != self._version:
+            self._fired_count_value = sum(
+                1 for cmd in self._command_list if cmd.fired
+            )
+            self._fired_count_version = self._version
+        return self._fired_count_value
+
+    def _progress_state(self) -> dict:
+        current_timestamp = self._current_timestamp()
         return {
-            'name': self._name,
-            'command_list': [
-                cmd.get_state()
-                for cmd in self._command_list
-            ],
+            'version': self._version,
+            'command_count': len(self._command_list),
+            'fired_count': self._fired_count(),
             'time_paused': self._total_milliseconds_paused / 1000,
             'start_timestamp': (
                 (self._start_timestamp / 1000)
@@ -127,13 +360,97 @@ class Program:
                 else None
             ),
             'current_timestamp': (
-                (self._current_timestamp() / 1000)
-                if self._current_timestamp()
+                (current_timestamp / 1000)
+                if current_timestamp
                 else None
             ),
             'is_running': self._running
         }
 
+    def get_state(self, with_command_list: bool = True) -> dict:
+        state = {'name': self._name}
+        if with_command_list:
+            state['command_list'] = [
+                cmd.get_state()
+                for cmd in self._command_list
+            ]
+        state.update(self._progress_state())
+        return state
+
+    def _get_command_list_json(self) -> str:
+        if self._command_list_json_version != self._version:
+            self._command_list_json = "[" + ", ".join(
+                cmd.get_state_json() for cmd in self._command_list
+            ) + "]"
+            self._command_list_json_version = self._version
+        return self._command_list_json
+
+    def get_state_json(self, with_command_list: bool = True) -> str:
+        state_json = "{\"name\": " + json.dumps(self._name)
+        if with_command_list:
+            state_json += (
+                ", \"command_list\": " + self._get_command_list_json()
+            )
+        return state_json + ", " + json.dumps(self._progress_state())[1:]
+
+    def iter_state_json(self, with_command_list: bool = True):
+        yield "{\"name\": " + json.dumps(self._name)
+        if with_command_list:
+            yield ", \"command_list\": "
+            yield from iter_json(
+                RawJson(cmd.get_state_json()) for cmd in self._command_list
+            )
+        yield ", " + json.dumps(self._progress_state())[1:]
+
+    def _command_changed_since(
+        self, command: Command, since_version: int | None
+    ) -> bool:
+        return (
+            since_version is None
+            or command.changed_version > since_version
+        )
+
+    def iter_commands_json(
+        self, offset: int, limit: int, since_version: int = None
+    ):
+        total = 0
+        for command in self._command_list:
+            if self._command_changed_since(command, since_version):
+                total += 1
+        yield json.dumps({
+            'version': self._version,
+            'total': total,
+            'offset': offset,
+            'limit': limit
+        })[:-1] + ", \"commands\": "
+        yield from iter_json(self._iter_commands_page(
+            offset, limit, since_version
+        ))
+        yield ", \"removed\": " + json.dumps(
+            self.removed_command_ids(since_version)
+        ) + "}"
+
+    def removed_command_ids(self, since_version: int = None) -> list[int]:
+        if since_version is None:
+            return []
+        return [
+            command_id for command_id, version in self._removed_commands
+            if version > since_version
+        ]
+
+    def _iter_commands_page(
+        self, offset: int, limit: int, since_version: int | None
+    ):
+        matched = 0
+        for command in self._command_list:
+            if not self._command_changed_since(command, since_version):
+                continue
+            matched += 1
+            if matched > offset + limit:
+                break
+            if matched > offset:
+                yield RawJson(command.get_state_json())
+
     def _current_timestamp(self) -> int | None:
         if self._paused:
             return self._last_current_timestamp_before_pause
@@ -141,6 +458,17 @@ class Program:
             return None
         return tu.timestamp_now() - self._start_timestamp
 
+    def milliseconds_to_next_command(self) -> int | None:
+        if (
+            not self._running
+            or self._paused
+            or self._command_index >= len(self._command_list)
+        ):
+            return None
+        return self._command_list[self._command_index].milliseconds_left(
+            self._start_timestamp
+        )
+
     @property
     def name(self) -> str:
         return self._name
@@ -149,11 +477,16 @@ class Program:
     def running(self) -> bool:
         return self._running
 
+    @property
+    def version(self) -> int:
+        return self._version
+
     def _cleanup(self):
         self._timer.deinit()
         self._stop_flag = False
         self._callback()
         self._running = False
+        self._bump_version()
 
     def _timer_callback(self, _: Timer):
         if self._stop_flag or not self._command_list:
@@ -179,6 +512,7 @@ class Program:
         self._last_current_timestamp_before_pause = (
             tu.timestamp_now() - self._start_timestamp
         )
+        self._bump_version()
         self._pause_handler()
 
     def _pause_handler(self):
@@ -190,6 +524,7 @@ class Program:
         self._paused = False
         self._milliseconds_paused = tu.timestamp_now() - self._pause_timestamp
         self._total_milliseconds_paused += self._milliseconds_paused
+        self._bump_version()
         for command in self._command_list[self._command_index:]:
             command.increase_timestamp(self._milliseconds_paused)
         self._command_handler()
@@ -201,10 +536,10 @@ class Program:
         command = self._command_list[self._command_index]
         if command.milliseconds_left(self._start_timestamp) <= 0:
             try:
-                logger.debug(f"Light {command}", __file__)
+                logger.debug("Light {}", __file__, command)
                 command.light()
             except Exception as ex:
                 logger.exception(
-                    "Exception while fireing {command}", ex, __file__
+                    f"Exception while fireing {command}", ex, __file__
                 )
             self._command_index += 1
@@ -0,0 +1,117 @@
+import os
+import json
+import hashlib
+import binascii
+from backend.logger import logger
+from backend.rl_exception import RlException
+
+
+class InvalidProgramHash(RlException):
+    pass
+
+
+class ProgramCache:
+
+    DIRECTORY: str = "/programs"
+    INDEX_FILENAME: str = "/programs/index.json"
+    BUDGET: int = 64 * 1024  # bytes
+    HASH_LENGTH: int = 16
+    HEX_DIGITS: str = "0123456789abcdef"
+
+    _index: dict
+
+    def __init__(self):
+        try:
+            os.stat(self.DIRECTORY)
+        except OSError:
+            os.mkdir(self.DIRECTORY)
+        try:
+            with open(self.INDEX_FILENAME, 'r') as file:
+                self._index = json.load(file)
+            self._index['entries']
+        except (OSError, ValueError, KeyError):
+            self._index = {'clock': 0, 'entries': {}}
+
+    def content_hash(self, content) -> str:
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha256(content).digest()
+        return binascii.hexlify(digest).decode()[:self.HASH_LENGTH]
+
+    def _check_hash(self, content_hash: str):
+        if not isinstance(content_hash, str) or len(
+            content_hash
+        ) != self.HASH_LENGTH or any(
+            character not in self.HEX_DIGITS for character in content_hash
+        ):
+            raise InvalidProgramHash(f"invalid program hash: {content_hash}")
+
+    def _path(self, content_hash: str) -> str:
+        return f"{self.DIRECTORY}/{content_hash}.prg"
+
+    def _save_index(self):
+        temporary_filename = self.INDEX_FILENAME + ".tmp"
+        with open(temporary_filename, 'w') as file:
+            json.dump(self._index, file)
+        os.rename(temporary_filename, self.INDEX_FILENAME)
+
+    def _touch(self, content_hash: str):
+        self._index['clock'] += 1
+        self._index['entries'][content_hash]['used'] = self._index['clock']
+
+    def _used_bytes(self) -> int:
+        return sum(
+            entry['size'] for entry in self._index['entries'].values()
+        )
+
+    def _evict(self, needed: int):
+        entries = self._index['entries']
+        while entries and self._used_bytes() + needed > self.BUDGET:
+            oldest = min(entries, key=lambda key: entries[key]['used'])
+            del entries[oldest]
+            try:
+                os.remove(self._path(oldest))
+            except OSError:
+                pass
+            logger.debug("Evicted cached program {}", __file__, oldest)
+
+    def contains(self, content_hash: str) -> bool:
+        self._check_hash(content_hash)
+        return content_hash in self._index['entries']
+
+    def store(self, content) -> str:
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        content_hash = self.content_hash(content)
+        if content_hash in self._index['entries']:
+            self._touch(content_hash)
+        else:
+            if len(content) > self.BUDGET:
+                return content_hash
+            self._evict(len(content))
+            with open(self._path(content_hash), 'wb') as file:
+                file.write(content)
+            self._index['entries'][content_hash] = {
+                'size': len(content), 'used': 0
+            }
+            self._touch(content_hash)
+            logger.debug("Cached program {}", __file__, content_hash)
+        self._save_index()
+        return content_hash
+
+    def load(self, content_hash: str) -> bytes | None:
+        if not self.contains(content_hash):
+            return None
+        try:
+            with open(self._path(content_hash), 'rb') as file:
+                content = file.read()
+        except OSError:
+            del self._index['entries'][content_hash]
+            self._save_index()
+            return None
+        self._touch(content_hash)
+        self._save_index()
+        return content
+
+
+program_cache = ProgramCache()
@@ -1,5 +1,6 @@
 import socket
 import json
+from backend.rl_exception import InvalidParameter
 
 
 class Request:
@@ -10,9 +11,11 @@ class Request:
     _client_port: int
 
     _method: str
+    _is_head: bool
     _url: str
     _headers: dict[str, str]
-    _payload: str
+    _payload: str | None
+    _body: bytes | bytearray | None
     _location: str
     _get_parameters: dict[str, str]
     _valid: bool
@@ -21,13 +24,16 @@ class Request:
 
     def __init__(
         self, content: str, socket: socket.socket,
-        client_address: str, client_port: int
+        client_address: str, client_port: int,
+        body: bytes | bytearray = None
     ):
         self._content = content
+        self._body = body
         self._socket = socket
         self._client_address = client_address
         self._client_port = client_port
         self.url_parameters = {}
+        self._is_head = False
         self._valid = True
         self._parse_content()
 
@@ -42,6 +48,7 @@ class Request:
             self._valid = False
             print("INVALID REQUEST: ", lines[0])
             return
+        self._method = self._method.upper()
         self._headers = {}
         for line in lines[1:]:
             if line == "":
@@ -50,17 +57,36 @@ class Request:
             self._headers[line[0:colon_index].lower()] = (
                 line[colon_index + 2:]
             )
-        self._payload = "\n".join(lines[len(self._headers) + 2:])
+        if self._body is None:
+            self._payload = "\n".join(lines[len(self._headers) + 2:])
+        else:
+            self._payload = None
         if "?" in self._url:
-            self._location, parameter_string = self._url.split("?")
-            self._get_parameters = {
-                pair.split("=")[0]: pair.split("=")[1]
-                for pair in parameter_string.split("&")
-            }
+            self._location, _, parameter_string = self._url.partition("?")
+            self._get_parameters = {}
+            for pair in parameter_string.split("&"):
+                if pair:
+                    key, _, value = pair.partition("=")
+                    self._get_parameters[self._unquote(key)] = (
+                        self._unquote(value)
+                    )
         else:
             self._location = self._url
             self._get_parameters = {}
 
+    def _unquote(self, value: str) -> str:
+        if "%" not in value and "+" not in value:
+            return value
+        parts = value.replace("+", " ").split("%")
+        result = bytearray(parts[0].encode('utf-8'))
+        for part in parts[1:]:
+            try:
+                result.append(int(part[:2], 16))
+                result.extend(part[2:].encode('utf-8'))
+            except ValueError:
+                result.extend(b"%" + part.encode('utf-8'))
+        return bytes(result).decode('utf-8')
+
     @property
     def valid(self) -> bool:
         return self._valid
@@ -71,7 +97,15 @@ class Request:
 
     @property
     def method(self) -> str:
-        return self._method.upper()
+        return self._method
+
+    @property
+    def is_head(self) -> bool:
+        return self._is_head
+
+    def handle_head_as_get(self):
+        self._method = 'GET'
+        self._is_head = True
 
     @property
     def client_address(self) -> str:
@@ -91,8 +125,22 @@ class Request:
 
     @property
     def payload(self) -> str:
+        if self._payload is None:
+            self._payload = str(self._body, 'utf-8')
         return self._payload
 
+    @property
+    def body(self) -> bytes | bytearray:
+        if self._body is None:
+            return self._payload.encode('utf-8')
+        return self._body
+
+    @property
+    def is_binary(self) -> bool:
+        return self._headers.get("content-type", "").startswith(
+            "application/octet-stream"
+        )
+
     @property
     def location(self) -> str:
         return self._location
@@ -101,10 +149,43 @@ class Request:
     def get_parameters(self) -> dict[str, str]:
         return self._get_parameters
 
+    def get_int_parameter(self, name: str, default: int = None) -> int:
+        value = self._get_parameters.get(name, "")
+        if value == "":
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise InvalidParameter(f"{name} has to be an integer: {value}")
+
+    def accepts_encoding(self, encoding: str) -> bool:
+        accept_encoding = self._headers.get("accept-encoding", "")
+        for entry in accept_encoding.split(","):
+            name, _, parameters = entry.partition(";")
+            if name.strip() in (encoding, "*"):
+                parameters = parameters.replace(" ", "")
+                return not (
+                    parameters.startswith("q=0")
+                    and parameters.strip("q=0.") == ""
+                )
+        return False
+
+    def etag_matches(self, etag: str) -> bool:
+        if_none_match = self._headers.get("if-none-match", None)
+        if if_none_match is None:
+            return False
+        for entry in if_none_match.split(","):
+            entry = entry.strip()
+            if entry.startswith("W/"):
+                entry = entry[2:]
+            if entry == etag or entry == "*":
+                return True
+        return False
+
     @property
     def json_payload(self) -> dict:
         try:
-            return json.loads(self._payload)
+            return json.loads(self.payload)
         except json.JSONDecodeError:
             return {}
 
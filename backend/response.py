@@ -1,35 +1,95 @@
+import os
+import hashlib
+import binascii
+
+
 class Response:
 
     STATUS_CODES: dict[int, str] = {
         200: "OK",
         204: "No Content",
+        206: "Partial Content",
         301: "Moved Permanently",
+        304: "Not Modified",
         400: "Bad Request",
         404: "Not Found",
         405: "Method Not Allowed",
+        413: "Content Too Large",
+        416: "Range Not Satisfiable",
         500: "Internal Server Error",
         501: "Not Implemented"
     }
+    STATUS_LINES: dict[int, str] = {
+        status_code: f"HTTP/1.1 {status_code} {reason}"
+        for status_code, reason in STATUS_CODES.items()
+    }
 
     CONTENT_TYPE_HTML: str = "text/html"
     CONTENT_TYPE_JSON: str = "application/json"
     CONTENT_TYPE_PLAIN: str = "text/plain"
     CONTENT_TYPE_EVENT_STREAM: str = "text/event-stream"
+    CONTENT_TYPE_OCTET_STREAM: str = "application/octet-stream"
+
+    # preflight and status responses never change while running, so they
+    # are serialized once and sent as a single buffer
+    _cache: dict[str, tuple] = {}
 
     _content_type: str
     _status_code: int
     _headers: dict[str, str]
     _keep_alive: bool
+    _omit_body: bool
+    _raw: bytes | None
+    _raw_header_length: int
 
     @classmethod
-    def preflight_response(cls):
-        return cls(
-            status_code=204,
-            body="",
-            content_type=None,
-            keep_alive=True,
-            is_preflight=True
-        )
+    def preflight_response(cls, allowed_methods: str = "POST, GET, DELETE"):
+        def build() -> 'Response':
+            response = cls(
+                status_code=204,
+                body="",
+                content_type=None,
+                keep_alive=True,
+                is_preflight=True
+            )
+            response.add_header(
+                "Access-Control-Allow-Methods", allowed_methods
+            )
+            return response
+        return cls.cached(f"preflight:{allowed_methods}", build)
+
+    @classmethod
+    def status_response(cls, status_code: int, allowed_methods: str = None):
+        def build() -> 'Response':
+            response = cls(status_code=status_code)
+            if allowed_methods is not None:
+                response.add_header("Allow", allowed_methods)
+            return response
+        return cls.cached(f"status:{status_code}:{allowed_methods}", build)
+
+    @classmethod
+    def not_modified_response(cls, etag: str) -> 'Response':
+        response = cls(status_code=304, body="")
+        del response._headers["Content-Type"]
+        del response._headers["Content-Length"]
+        response.add_header("ETag", etag)
+        return response
+
+    @classmethod
+    def cached(cls, key: str, build: callable) -> 'Response':
+        entry = cls._cache.get(key, None)
+        if entry is None:
+            entry = build().to_cache_entry()
+            cls._cache[key] = entry
+        return cls.from_cache_entry(entry)
+
+    @classmethod
+    def from_cache_entry(cls, entry: tuple) -> 'Response':
+        status_code, keep_alive, header_length, raw = entry
+        response = cls(status_code=status_code, body="", keep_alive=keep_alive)
+        response._raw = raw
+        response._raw_header_length = header_length
+        return response
 
     def __init__(
         self,
@@ -69,10 +129,16 @@ class Response:
                 "Content-Length": str(len(body))
             }
         self._keep_alive = keep_alive
+        self._omit_body = False
+        self._raw = None
+        self._raw_header_length = 0
 
     def add_header(self, key: str, value: str):
         self._headers[key] = value
 
+    def omit_body(self):
+        self._omit_body = True
+
     @property
     def content_type(self) -> str:
         return self._content_type
@@ -87,10 +153,7 @@ class Response:
 
     @property
     def status_line(self) -> str:
-        return (
-            f"HTTP/1.1 {self._status_code} "
-            + f"{self.STATUS_CODES[self._status_code]}"
-        )
+        return self.STATUS_LINES[self._status_code]
 
     @property
     def header_string(self) -> str:
@@ -99,8 +162,180 @@ class Response:
             for key, value in self._headers.items()
         )
 
+    @property
+    def head(self) -> str:
+        return self.status_line + "\n" + self.header_string + "\n\n"
+
+    def to_cache_entry(self) -> tuple:
+        head = self.head.encode('utf-8')
+        raw = head
+        if self._content_type != self.CONTENT_TYPE_EVENT_STREAM:
+            raw += self._body.encode('utf-8')
+        return (self._status_code, self._keep_alive, len(head), raw)
+
     def iter_content(self, block_size: int):
-        yield self.status_line + "\n" + self.header_string + "\n\n"
+        if self._raw is not None:
+            if self._omit_body:
+                yield memoryview(self._raw)[:self._raw_header_length]
+            else:
+                yield self._raw
+            return
+        yield self.head
+        if self._omit_body:
+            return
         if self._content_type != self.CONTENT_TYPE_EVENT_STREAM:
             for i in range(0, len(self._body), block_size):
                 yield self._body[i:i + block_size]
+
+
+class FileResponse(Response):
+
+    BLOCK_SIZE: int = 1024
+
+    _buffer: bytearray = bytearray(BLOCK_SIZE)
+    _etags: dict[str, str] = {}
+
+    _path: str
+    _size: int
+    _offset: int
+    _length: int
+
+    @classmethod
+    def content_etag(cls, path: str) -> str:
+        etag = cls._etags.get(path, None)
+        if etag is None:
+            digest = hashlib.sha256()
+            view = memoryview(cls._buffer)
+            with open(path, 'rb') as file:
+                while True:
+                    read = file.readinto(cls._buffer)
+                    if not read:
+                        break
+                    digest.update(view[:read])
+            etag = f"\"{binascii.hexlify(digest.digest()[:8]).decode()}\""
+            cls._etags[path] = etag
+        return etag
+
+    def __init__(
+        self,
+        path: str,
+        content_type: str = Response.CONTENT_TYPE_PLAIN,
+        status_code: int = 200,
+        range_header: str = None
+    ):
+        self._size = os.stat(path)[6]
+        self._offset = 0
+        self._length = self._size
+        byte_range = None
+        if range_header is not None:
+            byte_range = self._parse_range(range_header, self._size)
+        if byte_range is False:
+            status_code = 416
+            self._length = 0
+        elif byte_range is not None:
+            status_code = 206
+            self._offset = byte_range[0]
+            self._length = byte_range[1] - byte_range[0] + 1
+        super().__init__(
+            status_code=status_code, body="", content_type=content_type
+        )
+        self._path = path
+        self.add_header("Content-Length", str(self._length))
+        self.add_header("Accept-Ranges", "bytes")
+        if byte_range is False:
+            self.add_header("Content-Range", f"bytes */{self._size}")
+        elif byte_range is not None:
+            self.add_header(
+                "Content-Range",
+                f"bytes {byte_range[0]}-{byte_range[1]}/{self._size}"
+            )
+
+    def _parse_range(self, range_header: str, size: int):
+        unit, _, ranges = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in ranges:
+            return None
+        first, _, last = ranges.strip().partition("-")
+        try:
+            if first == "":
+                start = max(size - int(last), 0)
+                end = size - 1
+            else:
+                start = int(first)
+                end = size - 1 if last == "" else min(int(last), size - 1)
+        except ValueError:
+            return None
+        if start >= size or end < start:
+            return False
+        return (start, end)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def iter_content(self, block_size: int):
+        yield self.head
+        if self._omit_body:
+            return
+        buffer = self._buffer
+        view = memoryview(buffer)
+        remaining = self._length
+        with open(self._path, 'rb') as file:
+            if self._offset:
+                file.seek(self._offset)
+            while remaining > 0:
+                read = file.readinto(buffer)
+                if not read:
+                    break
+                read = min(read, remaining)
+                remaining -= read
+                yield view[:read]
+
+
+class StreamResponse(Response):
+
+    BUFFER_SIZE: int = 1024
+
+    _buffer: bytearray = bytearray(BUFFER_SIZE)
+
+    _chunks: object
+
+    def __init__(
+        self,
+        chunks,
+        content_type: str = Response.CONTENT_TYPE_JSON,
+        status_code: int = 200
+    ):
+        super().__init__(
+            status_code=status_code, body="", content_type=content_type
+        )
+        del self._headers["Content-Length"]
+        self.add_header("Transfer-Encoding", "chunked")
+        self._chunks = chunks
+
+    def iter_content(self, block_size: int):
+        yield self.head
+        if self._omit_body:
+            return
+        buffer = self._buffer
+        view = memoryview(buffer)
+        used = 0
+        for chunk in self._chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            length = len(chunk)
+            if used + length > self.BUFFER_SIZE and used:
+                yield from self._iter_chunk(view[:used])
+                used = 0
+            if length >= self.BUFFER_SIZE:
+                yield from self._iter_chunk(chunk)
+            else:
+                view[used:used + length] = chunk
+                used += length
+        if used:
+            yield from self._iter_chunk(view[:used])
+        yield "0\r\n\r\n"
+
+    def _iter_chunk(self, chunk):
+        yield f"{len(chunk):x}\r\n"
+        yield chunk
+        yield "\r\n"
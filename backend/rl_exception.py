@@ -3,3 +3,7 @@ class RlException(Exception):
     def __init__(self, message: str = None):
         self.message = message if message else ""
         super().__init__(self.message)
+
+
+class InvalidParameter(RlException):
+    pass
@@ -6,6 +6,11 @@ from machine import Timer
 
 class Schedule:
 
+    MAX_PERIOD: int = 3600000  # 1 hour
+    SPIN_WINDOW: int = 20
+
+    _armed: list['Schedule'] = []
+
     _scheduled_time: str
     _callback: callable
     _timestamp: int
@@ -23,38 +28,72 @@ class Schedule:
         self._faulty = False
         self._timer = Timer()
 
+    @classmethod
+    def milliseconds_to_next(cls) -> int | None:
+        if not cls._armed:
+            return None
+        return min(schedule.milliseconds_left for schedule in cls._armed)
+
+    def _disarm(self):
+        if self in Schedule._armed:
+            Schedule._armed.remove(self)
+
     def start(self):
+        Schedule._armed.append(self)
+        # never fire from the caller, it still has to update its own state
         self._timer.init(
-            mode=Timer.PERIODIC,
-            period=config.time_resolution,
+            mode=Timer.ONE_SHOT,
+            period=1,
             callback=self._timer_callback
         )
 
     def cancel(self):
         self._cancel_flag = True
-        self.join()
+        self._timer.deinit()
+        self._disarm()
+        self._done = True
 
     def join(self):
         while not self._done:
             tu.sleep(config.time_resolution / 1000)
 
-    def _timer_callback(self, timer: Timer):
-        if not self._cancel_flag:
-            if tu.time_reached(self._timestamp):
-                try:
-                    logger.debug("Calling schedule callback", __file__)
-                    self._callback()
-                except Exception as ex:
-                    logger.exception(
-                        "Exception while calling schedule callback",
-                        ex,
-                        __file__
-                    )
-                    self._faulty = True
-                self._cancel_flag = True
+    def _arm(self):
+        milliseconds_left = self.milliseconds_left
+        if milliseconds_left > self.SPIN_WINDOW:
+            self._timer.init(
+                mode=Timer.ONE_SHOT,
+                period=min(
+                    max(milliseconds_left // 2, self.SPIN_WINDOW),
+                    self.MAX_PERIOD
+                ),
+                callback=self._timer_callback
+            )
         else:
-            timer.deinit()
+            self._fire(tu.ticks_add(tu.ticks_ms(), milliseconds_left))
+
+    def _fire(self, deadline: int):
+        while tu.ticks_diff(deadline, tu.ticks_ms()) > 0:
+            pass
+        try:
+            logger.debug("Calling schedule callback", __file__)
+            self._callback(max(self._timestamp, tu.timestamp_now()))
+        except Exception as ex:
+            logger.exception(
+                "Exception while calling schedule callback",
+                ex,
+                __file__
+            )
+            self._faulty = True
+        self._cancel_flag = True
+        self._disarm()
+        self._done = True
+
+    def _timer_callback(self, _: Timer):
+        if self._cancel_flag:
+            self._disarm()
             self._done = True
+        else:
+            self._arm()
 
     @property
     def timestamp(self) -> float:
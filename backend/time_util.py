@@ -1,12 +1,14 @@
 import time
-import ntptime
 # from backend.logger import logger
 # from backend.hardware import harware
 
 
 MACHINE_TIME_ORIGIN: int = 946684800  # 2000-01-01T00:00:00.000
 TIMEZONE_OFFSET: int = 3600  # 1 hour
-NTP_RETIRES: int = 4
+STEP_THRESHOLD: int = 128  # milliseconds
+MAX_SLEW_RATE: int = 500  # ppm
+MAX_DRIFT: int = 500000  # ppb
+REBASE_INTERVAL: int = 1 << 27  # milliseconds, well inside the ticks period
 
 
 def _current_seconds() -> int:
@@ -17,31 +19,98 @@ def _current_seconds() -> int:
     )
 
 
-def set_ntp_time():
-    for i in range(NTP_RETIRES + 1):
-        try:
-            # logger.info("setting time from ntp server", __file__)
-            ntptime.settime()
-            break
-        except Exception as ex:
-            # logger.exception(
-            #     "could not set time from ntp server. "
-            #     + f"retry {i + 1}/{NTP_RETIRES}",
-            #     ex, __file__
-            # )
-            pass
+# The wall clock is modelled as a base timestamp plus the monotonic ticks
+# elapsed since then, corrected by the estimated oscillator drift and by
+# a pending offset that is slewed in at most MAX_SLEW_RATE.
+_base_timestamp: int = _current_seconds() * 1000
+_base_ticks: int = time.ticks_ms()
+_drift: int = 0  # ppb
+_slew: int = 0  # milliseconds
+_synced: bool = False
+_held: bool = False
+
+
+def _applied_slew(elapsed: int) -> int:
+    limit = elapsed * MAX_SLEW_RATE // 1000000
+    return max(-limit, min(_slew, limit))
+
+
+def _model_timestamp(ticks: int) -> int:
+    elapsed = time.ticks_diff(ticks, _base_ticks)
+    return (
+        _base_timestamp
+        + elapsed
+        + elapsed * _drift // 1000000000
+        + _applied_slew(elapsed)
+    )
+
+
+def _rebase(ticks: int):
+    global _base_timestamp, _base_ticks, _slew
+    _slew -= _applied_slew(time.ticks_diff(ticks, _base_ticks))
+    _base_timestamp = _model_timestamp(ticks)
+    _base_ticks = ticks
+
+
+def adjust_clock(offset: int, drift: int = None) -> bool:
+    global _base_timestamp, _slew, _drift, _synced
+    _rebase(time.ticks_ms())
+    if drift is not None:
+        _drift = max(-MAX_DRIFT, min(drift, MAX_DRIFT))
+    stepped = not _synced or (abs(offset) > STEP_THRESHOLD and not _held)
+    if stepped:
+        _base_timestamp += offset
+        _slew = 0
     else:
-        # logger.error("could not set time from ntp server", __file__)
-        # panic("could not set time from ntp server")
-        pass
+        _slew = offset
+    _synced = True
+    return stepped
+
+
+def pending_slew() -> int:
+    return _slew - _applied_slew(time.ticks_diff(time.ticks_ms(), _base_ticks))
+
+
+def clock_drift() -> int:
+    return _drift
+
 
-def get_system_time() -> str:
-    y, mo, d, h, mi, s, *_ = time.localtime(_current_seconds() - MACHINE_TIME_ORIGIN)
-    return f"{y}-{mo:02d}-{d:02d}T{h:02d}:{mi:02d}:{s:02d}.{000}"
+def clock_synced() -> bool:
+    return _synced
+
+
+def hold_clock(held: bool):
+    global _held
+    _held = held
+
+
+def clock_held() -> bool:
+    return _held
+
+
+def system_seconds() -> int:
+    return timestamp_now() // 1000 - MACHINE_TIME_ORIGIN
+
+
+def get_system_time(seconds: int = None) -> str:
+    if seconds is None:
+        return timestamp_to_string(timestamp_now())
+    return timestamp_to_string((seconds + MACHINE_TIME_ORIGIN) * 1000)
+
+
+def timestamp_to_string(timestamp: int) -> str:
+    seconds, milliseconds = divmod(
+        timestamp - MACHINE_TIME_ORIGIN * 1000, 1000
+    )
+    y, mo, d, h, mi, s, *_ = time.localtime(seconds)
+    return f"{y}-{mo:02d}-{d:02d}T{h:02d}:{mi:02d}:{s:02d}.{milliseconds:03d}"
 
 
 def timestamp_now() -> int:
-    return _current_seconds() * 1000
+    ticks = time.ticks_ms()
+    if time.ticks_diff(ticks, _base_ticks) > REBASE_INTERVAL:
+        _rebase(ticks)
+    return _model_timestamp(ticks)
 
 
 def string_to_timestamp(string: str) -> float:
@@ -61,13 +130,19 @@ def string_to_timestamp(string: str) -> float:
             0,
             0,
         )
-    ) * 1000 + int(float(f"0.{fraction}") * 1000) + MACHINE_TIME_ORIGIN * 1000
+    ) * 1000 + int((fraction + "00")[:3]) + MACHINE_TIME_ORIGIN * 1000
+
+
+def ticks_ms() -> int:
+    return time.ticks_ms()
+
+
+def ticks_add(ticks: int, delta: int) -> int:
+    return time.ticks_add(ticks, delta)
 
 
-def time_reached(timestamp: float) -> bool:
-    if timestamp_now() >= timestamp:
-        print("REACHED:", timestamp_now(), timestamp)
-    return timestamp_now() >= timestamp
+def ticks_diff(end: int, start: int) -> int:
+    return time.ticks_diff(end, start)
 
 
 def sleep(seconds: float):
@@ -2,15 +2,18 @@ import socket
 import gc
 
 from backend.request import Request
+from backend.response import Response
 from backend.endpoints import router
 from backend.network_ import Network
 from backend.hardware import hardware
 from backend.led import led
+from backend.logger import logger
 
 
 class Webserver:
 
     PORT: int = 5000
+    MAX_BODY_SIZE: int = 48 * 1024  # bytes
 
     _connection: socket.socket
     _has_current_client: bool
@@ -41,43 +44,88 @@ class Webserver:
         self._connection.listen()
         print(f"Listening on {Network.ip()}:{self.PORT}")
 
+    def _receive_body(
+        self, received: bytes, content_length: int
+    ) -> bytearray | None:
+        body = bytearray(content_length)
+        body[:len(received)] = received
+        view = memoryview(body)
+        position = len(received)
+        while position < content_length:
+            read = self._current_client.readinto(view[position:])
+            if not read:
+                return None
+            position += read
+        return body
+
+    def _send_response(self, response: Response) -> bool:
+        # bodies are generated while sending, after the router's try
+        sent = False
+        try:
+            for block in response.iter_content(1024):
+                self._current_client.sendall(block)
+                sent = True
+            return True
+        except OSError as ex:
+            logger.warning("Could not send response: {}", __file__, ex)
+            return False
+        except Exception as ex:
+            logger.exception("Exception while sending response", ex, __file__)
+        if not sent:
+            error_response = Response.status_response(500)
+            try:
+                for block in error_response.iter_content(1024):
+                    self._current_client.sendall(block)
+            except OSError:
+                pass
+        return False
+
     def _mainloop(self):
         self._current_client, (client_address, client_port) = (
             self._connection.accept()
         )
-        raw_request = self._current_client.recv(1024).decode('ascii')
-        content_length_idx = raw_request.find('Content-Length: ')
+        raw_request = self._current_client.recv(1024)
+        emptyline_idx = raw_request.find(b'\r\n\r\n')
+        header_length = (
+            len(raw_request) if emptyline_idx == -1 else emptyline_idx + 4
+        )
+        head = raw_request[:header_length].decode('ascii')
+        body = raw_request[header_length:]
+        content_length_idx = head.find('Content-Length: ')
         if content_length_idx != -1:
-            next_line_idx = raw_request.find('\r\n', content_length_idx)
+            next_line_idx = head.find('\r\n', content_length_idx)
             content_length = int(
-                raw_request[content_length_idx + 16:next_line_idx].strip()
+                head[content_length_idx + 16:next_line_idx].strip()
             )
-            emptyline_idx = raw_request.find('\r\n\r\n')
-            header_length = emptyline_idx + 4
-            body_length = len(raw_request) - header_length
-            while body_length < content_length:
-                chunk = self._current_client.recv(1024).decode('ascii')
-                raw_request += chunk
-                body_length += len(chunk)
+            if content_length > self.MAX_BODY_SIZE:
+                self._send_response(Response.status_response(413))
+                self._current_client.close()
+                gc.collect()
+                return
+            if len(body) < content_length:
+                body = self._receive_body(body, content_length)
+                if body is None:
+                    self._current_client.close()
+                    return
         request = Request(
-            raw_request,
+            head,
             self._current_client,
             client_address,
-            client_port
+            client_port,
+            body
         )
         if not request.valid:
             self._current_client.close()
             return
         response = router.handle_request(request)
-        for block in response.iter_content(1024):
-            self._current_client.send(block)
-        if not response.keep_alive:
+        if not self._send_response(response) or not response.keep_alive:
             self._current_client.close()
             gc.collect()
         print(
             f"{client_address} > {request.method} "
             + f"{request.url} ({response.status_code})"
         )
+        logger.flush()
 
 
 webserver = Webserver()
@@ -0,0 +1,27 @@
+from fleet.control import ControlSender
+from fleet.discovery import DiscoveryListener, discover
+from fleet.fleet import FleetClient, FleetResult
+from fleet.program_format import (
+    ProgramFormatError, decode_program, encode_program
+)
+from fleet.remote import RemoteClient, RemoteError
+from fleet.show import ShowCompileError, compile_show
+from fleet.stats import LatencyStats
+from fleet.time_server import TimeServer
+
+__all__ = [
+    'ControlSender',
+    'DiscoveryListener',
+    'FleetClient',
+    'FleetResult',
+    'RemoteClient',
+    'RemoteError',
+    'LatencyStats',
+    'ProgramFormatError',
+    'decode_program',
+    'encode_program',
+    'ShowCompileError',
+    'TimeServer',
+    'compile_show',
+    'discover'
+]
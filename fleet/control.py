@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import hmac
+import socket
+import struct
+import time
+from typing import Optional
+
+
+GROUP: str = "239.255.82.76"
+PORT: int = 12301
+MAGIC: bytes = b"RLC1"
+HEADER_FORMAT: str = "!4sBIQ"
+SIGNATURE_SIZE: int = 8
+# the firmware's timestamps are local time, see backend/time_util.py
+TIMEZONE_OFFSET: int = 3600  # seconds
+
+ACTION_ARM: int = 1
+ACTION_GO: int = 2
+ACTION_PAUSE: int = 3
+ACTION_CONTINUE: int = 4
+ACTION_STOP: int = 5
+
+
+def device_timestamp(seconds: float) -> int:
+    return int((seconds + TIMEZONE_OFFSET) * 1000)
+
+
+class ControlSender:
+
+    REPEAT: int = 3
+    REPEAT_DELAY: float = 0.01  # seconds
+    TTL: int = 1
+
+    _key: bytes
+    _address: tuple
+    _sequence: int
+    _socket: Optional[socket.socket]
+
+    def __init__(self, key: str, group: str = GROUP, port: int = PORT):
+        if not key:
+            raise ValueError("control key must not be empty")
+        self._key = key.encode()
+        self._address = (group, port)
+        self._sequence = 0
+        self._socket = None
+
+    def _next_sequence(self) -> int:
+        # remotes only accept increasing sequence numbers, starting from
+        # the clock keeps them increasing across restarts of the sender
+        self._sequence = max(self._sequence + 1, int(time.time()))
+        return self._sequence
+
+    def datagram(self, action: int, target: float) -> bytes:
+        header = struct.pack(
+            HEADER_FORMAT,
+            MAGIC,
+            action,
+            self._next_sequence(),
+            device_timestamp(target)
+        )
+        signature = hmac.new(self._key, header, hashlib.sha256).digest()
+        return header + signature[:SIGNATURE_SIZE]
+
+    def _open(self) -> socket.socket:
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setsockopt(
+                socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.TTL
+            )
+        return self._socket
+
+    async def send(self, action: int, target: float = None) -> bytes:
+        # the same datagram is repeated against loss, remotes drop copies
+        datagram = self.datagram(
+            action, time.time() if target is None else target
+        )
+        sock = self._open()
+        for i in range(self.REPEAT):
+            if i:
+                await asyncio.sleep(self.REPEAT_DELAY)
+            sock.sendto(datagram, self._address)
+        return datagram
+
+    async def arm(self, target: float) -> bytes:
+        return await self.send(ACTION_ARM, target)
+
+    async def go(self, target: float = None) -> bytes:
+        return await self.send(ACTION_GO, target)
+
+    async def pause(self, target: float = None) -> bytes:
+        return await self.send(ACTION_PAUSE, target)
+
+    async def continue_(self, target: float = None) -> bytes:
+        return await self.send(ACTION_CONTINUE, target)
+
+    async def stop(self, target: float = None) -> bytes:
+        return await self.send(ACTION_STOP, target)
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
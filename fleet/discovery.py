@@ -0,0 +1,109 @@
+import asyncio
+import json
+import socket
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from fleet.remote import RemoteClient
+
+
+GROUP: str = "239.255.82.76"
+PORT: int = 12302
+QUERY: bytes = b"RLD?"
+
+
+def parse_announcement(data: bytes, host: str) -> Optional[Dict[str, Any]]:
+    try:
+        announcement = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(announcement, dict) or not isinstance(
+        announcement.get('device_id', None), str
+    ) or not isinstance(announcement.get('port', None), int):
+        return None
+    announcement['host'] = host
+    return announcement
+
+
+def _multicast_socket(group: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("", port))
+    sock.setsockopt(
+        socket.IPPROTO_IP,
+        socket.IP_ADD_MEMBERSHIP,
+        struct.pack("4s4s", socket.inet_aton(group), bytes(4))
+    )
+    sock.setblocking(False)
+    return sock
+
+
+class DiscoveryListener(asyncio.DatagramProtocol):
+
+    _remotes: Dict[str, Dict[str, Any]]
+    _transport: Optional[asyncio.DatagramTransport]
+
+    def __init__(self):
+        self._remotes = {}
+        self._transport = None
+
+    async def start(
+        self, host: str = None, port: int = PORT
+    ) -> 'DiscoveryListener':
+        # without a host the listener joins the announcement group
+        loop = asyncio.get_running_loop()
+        if host is None:
+            await loop.create_datagram_endpoint(
+                lambda: self, sock=_multicast_socket(GROUP, port)
+            )
+        else:
+            await loop.create_datagram_endpoint(
+                lambda: self, local_addr=(host, port)
+            )
+        return self
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    @property
+    def port(self) -> int:
+        return self._transport.get_extra_info('sockname')[1]
+
+    @property
+    def remotes(self) -> Dict[str, Dict[str, Any]]:
+        return self._remotes
+
+    def query(self, address: Tuple[str, int] = (GROUP, PORT)):
+        # remotes answer a query directly to the sender
+        self._transport.sendto(QUERY, address)
+
+    def clients(self, **kwargs) -> List[RemoteClient]:
+        return [
+            RemoteClient(
+                announcement['host'],
+                announcement['port'],
+                device_id,
+                **kwargs
+            )
+            for device_id, announcement in sorted(self._remotes.items())
+        ]
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, address: Tuple[str, int]):
+        announcement = parse_announcement(data, address[0])
+        if announcement is not None:
+            self._remotes[announcement['device_id']] = announcement
+
+
+async def discover(timeout: float = 1.0) -> List[RemoteClient]:
+    listener = await DiscoveryListener().start()
+    try:
+        listener.query()
+        await asyncio.sleep(timeout)
+    finally:
+        listener.close()
+    return listener.clients()
@@ -0,0 +1,224 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from fleet.program_format import CONTENT_TYPE, decode_program
+from fleet.remote import HASH_LENGTH, body_hash
+
+
+HEX_DIGITS: str = "0123456789abcdef"
+
+
+class EmulatedRemote:
+
+    _device_id: str
+    _fuse_amount: int
+    _delay: float
+    _keep_alive: bool
+    _drop_requests: int
+    _drop_responses: int
+    _server: Optional[asyncio.AbstractServer]
+    _state: str
+    _program: Optional[Dict[str, Any]]
+    _requests: List[Tuple[str, str]]
+    _connections: int
+    _cache: Dict[str, Dict[str, Any]]
+    _master: Optional[Tuple[str, Optional[int]]]
+
+    def __init__(
+        self,
+        device_id: str,
+        fuse_amount: int = 4,
+        delay: float = 0.0,
+        keep_alive: bool = False,
+        drop_requests: int = 0,
+        drop_responses: int = 0
+    ):
+        self._device_id = device_id
+        self._fuse_amount = fuse_amount
+        self._delay = delay
+        self._keep_alive = keep_alive
+        self._drop_requests = drop_requests
+        self._drop_responses = drop_responses
+        self._server = None
+        self._state = 'not_loaded'
+        self._program = None
+        self._requests = []
+        self._connections = 0
+        self._cache = {}
+        self._master = None
+
+    async def start(self, host: str = "127.0.0.1") -> 'EmulatedRemote':
+        self._server = await asyncio.start_server(self._handle, host, 0)
+        return self
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def device_id(self) -> str:
+        return self._device_id
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def program(self) -> Optional[Dict[str, Any]]:
+        return self._program
+
+    @property
+    def master(self) -> Optional[Tuple[str, Optional[int]]]:
+        return self._master
+
+    @property
+    def requests(self) -> List[Tuple[str, str]]:
+        return self._requests
+
+    @property
+    def drop_responses(self) -> int:
+        return self._drop_responses
+
+    @drop_responses.setter
+    def drop_responses(self, count: int):
+        # the next requests take effect without an answer
+        self._drop_responses = count
+
+    @property
+    def connections(self) -> int:
+        return self._connections
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        self._connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                length = 0
+                binary = False
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    key, _, value = line.partition(":")
+                    if key.lower() == "content-length":
+                        length = int(value)
+                    elif key.lower() == "content-type":
+                        binary = value.strip() == CONTENT_TYPE
+                payload = await reader.readexactly(length) if length else b""
+                self._requests.append((method, path))
+                if self._drop_requests > 0:
+                    self._drop_requests -= 1
+                    break
+                if self._delay:
+                    await asyncio.sleep(self._delay)
+                if binary:
+                    decoded = decode_program(payload)
+                else:
+                    decoded = json.loads(payload) if payload else {}
+                if (method, path) == ('POST', "/discover"):
+                    self._master = (
+                        writer.get_extra_info('peername')[0],
+                        decoded.get('port', None)
+                    )
+                status_code, content = self._respond(method, path, decoded)
+                # like the firmware, only programs that loaded are cached
+                if (method, path) == ('POST', "/program") and (
+                    200 <= status_code < 300
+                ):
+                    self._cache_payload(payload, binary)
+                if self._drop_responses > 0:
+                    self._drop_responses -= 1
+                    break
+                body = json.dumps(content).encode()
+                writer.write(
+                    f"HTTP/1.1 {status_code} X\n".encode()
+                    + b"Content-Type: application/json\n"
+                    + f"Content-Length: {len(body)}\n\n".encode()
+                    + body
+                )
+                await writer.drain()
+                if not self._keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    def _respond(
+        self, method: str, path: str, payload: Dict[str, Any]
+    ) -> Tuple[int, Any]:
+        if (method, path) == ('GET', "/state"):
+            return 200, {
+                'controller': {'state': self._state},
+                'config': {'config': {
+                    'device_id': self._device_id,
+                    'fuse_amounts': [self._fuse_amount]
+                }},
+                'program': self._program,
+                'is_remote': True
+            }
+        if path == "/discover" and method in ('GET', 'POST'):
+            return 200, {
+                'device_id': self._device_id,
+                'is_remote': True,
+                'fuse_amount': self._fuse_amount
+            }
+        if (method, path) == ('POST', "/program"):
+            # same order of checks as the firmware
+            if self._state != 'not_loaded':
+                return 400, {'error': "ProgramAlreadyLoaded"}
+            if 'hash' in payload and 'event_list' not in payload:
+                content_hash = payload['hash']
+                if not isinstance(content_hash, str) or len(
+                    content_hash
+                ) != HASH_LENGTH or content_hash.strip(HEX_DIGITS):
+                    return 400, {'error': "InvalidProgramHash"}
+                if content_hash not in self._cache:
+                    return 404, {}
+                payload = self._cache[content_hash]
+            if payload.get('device_id', self._device_id) != self._device_id:
+                return 400, {'error': "WrongDevice"}
+            self._program = payload
+            self._state = 'loaded'
+            return 200, {}
+        if (method, path) == ('DELETE', "/program"):
+            if self._state != 'loaded':
+                return 400, {'error': "NotProgramLoaded"}
+            self._program = None
+            self._state = 'not_loaded'
+            return 200, {}
+        if (method, path) == ('POST', "/program/control"):
+            return self._control(payload.get('action', None))
+        return 404, {}
+
+    def _cache_payload(self, body: bytes, binary: bool):
+        payload = decode_program(body) if binary else json.loads(body)
+        if 'event_list' in payload:
+            self._cache[body_hash(body)] = payload
+
+    def _control(self, action: str) -> Tuple[int, Any]:
+        transitions = {
+            'schedule': (('loaded',), 'scheduled'),
+            'unschedule': (('scheduled',), 'loaded'),
+            'run': (('loaded', 'scheduled'), 'running'),
+            'pause': (('running',), 'paused'),
+            'continue': (('paused',), 'running'),
+            'stop': (('running', 'paused'), 'not_loaded')
+        }
+        if action not in transitions:
+            return 400, {'error': "UnknownAction"}
+        allowed, new_state = transitions[action]
+        if self._state not in allowed:
+            return 400, {'error': "InvalidState"}
+        self._state = new_state
+        if new_state == 'not_loaded':
+            self._program = None
+        return 200, {}
@@ -0,0 +1,154 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from fleet.remote import RemoteClient, RemoteError
+from fleet.stats import LatencyStats
+
+
+class FleetResult:
+
+    _device_id: str
+    _value: Any
+    _error: Optional[RemoteError]
+
+    def __init__(
+        self, device_id: str, value: Any = None, error: RemoteError = None
+    ):
+        self._device_id = device_id
+        self._value = value
+        self._error = error
+
+    @property
+    def device_id(self) -> str:
+        return self._device_id
+
+    @property
+    def ok(self) -> bool:
+        return self._error is None
+
+    @property
+    def value(self) -> Any:
+        return self._value
+
+    @property
+    def error(self) -> Optional[RemoteError]:
+        return self._error
+
+    def __repr__(self) -> str:
+        if self.ok:
+            return f"FleetResult({self._device_id!r}, ok)"
+        return f"FleetResult({self._device_id!r}, {self._error})"
+
+
+class FleetClient:
+
+    _remotes: Dict[str, RemoteClient]
+    _concurrency: Optional[asyncio.Semaphore]
+
+    def __init__(
+        self, remotes: Iterable[RemoteClient], concurrency: int = None
+    ):
+        self._remotes = {remote.device_id: remote for remote in remotes}
+        self._concurrency = (
+            None if concurrency is None else asyncio.Semaphore(concurrency)
+        )
+
+    async def __aenter__(self) -> 'FleetClient':
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    @property
+    def remotes(self) -> Dict[str, RemoteClient]:
+        return self._remotes
+
+    async def _call(
+        self,
+        remote: RemoteClient,
+        operation: Callable[[RemoteClient], Awaitable[Any]]
+    ) -> FleetResult:
+        try:
+            if self._concurrency is None:
+                value = await operation(remote)
+            else:
+                async with self._concurrency:
+                    value = await operation(remote)
+        except RemoteError as ex:
+            return FleetResult(remote.device_id, error=ex)
+        return FleetResult(remote.device_id, value)
+
+    async def fan_out(
+        self,
+        operation: Callable[[RemoteClient], Awaitable[Any]],
+        device_ids: Iterable[str] = None
+    ) -> Dict[str, FleetResult]:
+        remotes = (
+            list(self._remotes.values()) if device_ids is None
+            else [self._remotes[device_id] for device_id in device_ids]
+        )
+        results = await asyncio.gather(
+            *(self._call(remote, operation) for remote in remotes)
+        )
+        return {result.device_id: result for result in results}
+
+    async def upload(
+        self, name: str, event_lists: Dict[str, List[Dict[str, Any]]]
+    ) -> Dict[str, FleetResult]:
+        return await self.fan_out(
+            lambda remote: remote.upload_program(
+                name, event_lists[remote.device_id]
+            ),
+            event_lists.keys()
+        )
+
+    async def upload_show(
+        self, payloads: Dict[str, Dict[str, Any]], binary: bool = False
+    ) -> Dict[str, FleetResult]:
+        return await self.fan_out(
+            lambda remote: remote.upload_payload(
+                payloads[remote.device_id], binary=binary
+            ),
+            payloads.keys()
+        )
+
+    async def fuse_amounts(self) -> Dict[str, int]:
+        results = await self.fan_out(lambda remote: remote.discover())
+        return {
+            device_id: result.value['fuse_amount']
+            for device_id, result in results.items()
+            if result.ok
+        }
+
+    async def register_master(
+        self, port: int = None
+    ) -> Dict[str, FleetResult]:
+        return await self.fan_out(
+            lambda remote: remote.register_master(port)
+        )
+
+    async def unload(self) -> Dict[str, FleetResult]:
+        return await self.fan_out(lambda remote: remote.unload_program())
+
+    async def schedule(self, time: str) -> Dict[str, FleetResult]:
+        return await self.fan_out(lambda remote: remote.schedule(time))
+
+    async def run(self) -> Dict[str, FleetResult]:
+        return await self.fan_out(lambda remote: remote.run())
+
+    async def stop(self) -> Dict[str, FleetResult]:
+        return await self.fan_out(lambda remote: remote.stop())
+
+    async def collect_state(self) -> Dict[str, FleetResult]:
+        return await self.fan_out(lambda remote: remote.get_state())
+
+    def latency_stats(self) -> Dict[str, LatencyStats]:
+        return {
+            device_id: remote.stats
+            for device_id, remote in self._remotes.items()
+        }
+
+    async def close(self):
+        await asyncio.gather(
+            *(remote.close() for remote in self._remotes.values())
+        )
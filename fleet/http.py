@@ -0,0 +1,138 @@
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+
+class HttpError(Exception):
+    pass
+
+
+class HttpResponse:
+
+    _status_code: int
+    _headers: Dict[str, str]
+    _body: bytes
+
+    def __init__(self, status_code: int, headers: Dict[str, str], body: bytes):
+        self._status_code = status_code
+        self._headers = headers
+        self._body = body
+
+    @property
+    def status_code(self) -> int:
+        return self._status_code
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return self._headers
+
+    @property
+    def body(self) -> bytes:
+        return self._body
+
+    @property
+    def keep_alive(self) -> bool:
+        return self._headers.get('connection', "").lower() != "close"
+
+    def json(self) -> Any:
+        return json.loads(self._body) if self._body else None
+
+
+class HttpConnection:
+
+    _host: str
+    _port: int
+    _reader: asyncio.StreamReader
+    _writer: asyncio.StreamWriter
+
+    @classmethod
+    async def open(cls, host: str, port: int) -> 'HttpConnection':
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(host, port, reader, writer)
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ):
+        self._host = host
+        self._port = port
+        self._reader = reader
+        self._writer = writer
+
+    @property
+    def closed(self) -> bool:
+        return self._reader.at_eof() or self._writer.is_closing()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Any] = None,
+        body: Optional[bytes] = None
+    ) -> HttpResponse:
+        if body is None:
+            content_type = "application/json"
+            body = b"" if payload is None else json.dumps(payload).encode()
+        else:
+            content_type = "application/octet-stream"
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            + f"Host: {self._host}:{self._port}\r\n"
+            + f"Content-Type: {content_type}\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        self._writer.write(head.encode() + body)
+        await self._writer.drain()
+        return await self._read_response(method)
+
+    async def _read_line(self) -> str:
+        line = await self._reader.readline()
+        if not line:
+            raise asyncio.IncompleteReadError(b"", None)
+        return line.decode('latin-1').rstrip("\r\n")
+
+    async def _read_response(self, method: str) -> HttpResponse:
+        status_line = await self._read_line()
+        try:
+            status_code = int(status_line.split(" ", 2)[1])
+        except (IndexError, ValueError):
+            raise HttpError(f"invalid status line: {status_line!r}")
+        headers = {}
+        while True:
+            line = await self._read_line()
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        if method == 'HEAD' or status_code in (204, 304):
+            body = b""
+        elif headers.get('transfer-encoding', "").lower() == "chunked":
+            body = await self._read_chunked()
+        elif 'content-length' in headers:
+            body = await self._reader.readexactly(
+                int(headers['content-length'])
+            )
+        else:
+            body = await self._reader.read()
+            headers['connection'] = "close"
+        return HttpResponse(status_code, headers, body)
+
+    async def _read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            size = int((await self._read_line()).split(";")[0], 16)
+            if size == 0:
+                await self._read_line()
+                return b"".join(chunks)
+            chunks.append(await self._reader.readexactly(size))
+            await self._reader.readexactly(2)
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
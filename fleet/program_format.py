@@ -0,0 +1,120 @@
+"""
+Compact binary encoding of a single-device program payload.
+
+Layout (little endian):
+
+    header   magic "RLP1", version, flags, cue count, crc32 of the rest
+    strings  program name and device id, each length byte + utf-8
+    records  cue count times (timestamp in ms: u32, fuse index: u16)
+    names    optional, one length byte + utf-8 per cue
+
+The fuse index is the letter index times 16 plus the fuse number, the
+same numbering the firmware uses for addresses.
+"""
+import binascii
+import struct
+from typing import Any, Dict, List, Tuple
+
+
+MAGIC: bytes = b"RLP1"
+VERSION: int = 1
+HEADER_FORMAT: str = "<4sBBHI"
+HEADER_SIZE: int = struct.calcsize(HEADER_FORMAT)
+RECORD_FORMAT: str = "<IH"
+RECORD_SIZE: int = struct.calcsize(RECORD_FORMAT)
+FLAG_NAMES: int = 0x01
+NUMBERS_PER_LETTER: int = 16
+LETTERS: str = "abcdefghijklmnopqrstuvwxyz"
+CONTENT_TYPE: str = "application/octet-stream"
+
+
+class ProgramFormatError(ValueError):
+    pass
+
+
+def _encode_string(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    if len(encoded) > 255:
+        raise ProgramFormatError(f"string longer than 255 bytes: {value!r}")
+    return bytes((len(encoded),)) + encoded
+
+
+def _decode_string(data: bytes, position: int) -> Tuple[str, int]:
+    end = position + 1 + data[position]
+    if end > len(data):
+        raise ProgramFormatError("binary program truncated")
+    return data[position + 1:end].decode('utf-8'), end
+
+
+def _fuse_index(event: Dict[str, Any]) -> int:
+    letter = str(event['letter']).lower()
+    number = int(event['number'])
+    if letter not in LETTERS or not 0 <= number < NUMBERS_PER_LETTER:
+        raise ProgramFormatError(
+            f"invalid fuse {event['letter']}{event['number']}"
+        )
+    return LETTERS.index(letter) * NUMBERS_PER_LETTER + number
+
+
+def encode_program(
+    payload: Dict[str, Any], include_names: bool = True
+) -> bytes:
+    event_list = payload['event_list']
+    if len(event_list) > 0xFFFF:
+        raise ProgramFormatError(f"too many cues: {len(event_list)}")
+    body = bytearray(_encode_string(payload['name']))
+    body += _encode_string(payload['device_id'])
+    for event in event_list:
+        # same rounding as Program.from_json on the firmware
+        timestamp = int(float(event['timestamp']) * 1000)
+        body += struct.pack(RECORD_FORMAT, timestamp, _fuse_index(event))
+    if include_names:
+        for event in event_list:
+            body += _encode_string(event['name'])
+    header = struct.pack(
+        HEADER_FORMAT,
+        MAGIC,
+        VERSION,
+        FLAG_NAMES if include_names else 0,
+        len(event_list),
+        binascii.crc32(body)
+    )
+    return header + bytes(body)
+
+
+def decode_program(data: bytes) -> Dict[str, Any]:
+    if len(data) < HEADER_SIZE:
+        raise ProgramFormatError("binary program truncated")
+    magic, version, flags, cue_count, checksum = struct.unpack_from(
+        HEADER_FORMAT, data, 0
+    )
+    if magic != MAGIC:
+        raise ProgramFormatError("not a binary program")
+    if version != VERSION:
+        raise ProgramFormatError(f"unsupported version: {version}")
+    if binascii.crc32(data[HEADER_SIZE:]) != checksum:
+        raise ProgramFormatError("checksum mismatch")
+    name, position = _decode_string(data, HEADER_SIZE)
+    device_id, position = _decode_string(data, position)
+    names_position = position + cue_count * RECORD_SIZE
+    if names_position > len(data):
+        raise ProgramFormatError("binary program truncated")
+    event_list: List[Dict[str, Any]] = []
+    for _ in range(cue_count):
+        timestamp, fuse_index = struct.unpack_from(
+            RECORD_FORMAT, data, position
+        )
+        position += RECORD_SIZE
+        letter = LETTERS[fuse_index // NUMBERS_PER_LETTER]
+        number = fuse_index % NUMBERS_PER_LETTER
+        if flags & FLAG_NAMES:
+            event_name, names_position = _decode_string(data, names_position)
+        else:
+            event_name = f"{device_id}::{letter}{number}"
+        event_list.append({
+            'name': event_name,
+            'letter': letter,
+            'number': number,
+            'timestamp': timestamp / 1000
+        })
+    return {'name': name, 'device_id': device_id, 'event_list': event_list}
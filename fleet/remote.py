@@ -0,0 +1,309 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fleet.http import HttpConnection, HttpError, HttpResponse
+from fleet.program_format import encode_program
+from fleet.stats import LatencyStats
+
+
+HASH_LENGTH: int = 16
+# the remote's state after each control action took effect
+ACTION_STATES: Dict[str, str] = {
+    'schedule': 'scheduled',
+    'unschedule': 'loaded',
+    'run': 'running',
+    'pause': 'paused',
+    'continue': 'running',
+    'stop': 'not_loaded'
+}
+
+
+def body_hash(body: bytes) -> str:
+    # matches the hash the firmware computes over the request body
+    return hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+
+
+def payload_hash(payload: Dict[str, Any]) -> str:
+    return body_hash(json.dumps(payload).encode())
+
+
+class RemoteError(Exception):
+
+    device_id: str
+    status_code: Optional[int]
+
+    def __init__(
+        self, device_id: str, message: str, status_code: int = None
+    ):
+        super().__init__(f"{device_id}: {message}")
+        self.device_id = device_id
+        self.status_code = status_code
+
+
+class RemoteClient:
+
+    PORT: int = 5000
+    TIMEOUT: float = 2.0  # seconds
+    RETRIES: int = 2
+    RETRY_DELAY: float = 0.05  # seconds
+    POOL_SIZE: int = 2
+
+    _host: str
+    _port: int
+    _device_id: str
+    _timeout: float
+    _retries: int
+    _retry_delay: float
+    _pool_size: int
+    _idle: List[HttpConnection]
+    _slots: asyncio.Semaphore
+    _stats: LatencyStats
+
+    def __init__(
+        self,
+        host: str,
+        port: int = PORT,
+        device_id: str = None,
+        timeout: float = TIMEOUT,
+        retries: int = RETRIES,
+        retry_delay: float = RETRY_DELAY,
+        pool_size: int = POOL_SIZE
+    ):
+        self._host = host
+        self._port = port
+        self._device_id = device_id if device_id else f"{host}:{port}"
+        self._timeout = timeout
+        self._retries = retries
+        self._retry_delay = retry_delay
+        self._pool_size = pool_size
+        self._idle = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self._stats = LatencyStats()
+
+    @property
+    def host(self) -> str:
+        return self._host
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    @property
+    def device_id(self) -> str:
+        return self._device_id
+
+    @property
+    def stats(self) -> LatencyStats:
+        return self._stats
+
+    async def _acquire(self) -> Tuple[HttpConnection, bool]:
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.closed:
+                return connection, True
+            await connection.close()
+        return await HttpConnection.open(self._host, self._port), False
+
+    async def _release(
+        self, connection: HttpConnection, response: HttpResponse
+    ):
+        if response.keep_alive and len(self._idle) < self._pool_size:
+            self._idle.append(connection)
+        else:
+            await connection.close()
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Any],
+        body: Optional[bytes],
+        idempotent: bool = True
+    ) -> HttpResponse:
+        connection, reused = await self._acquire()
+        try:
+            try:
+                response = await connection.request(
+                    method, path, payload, body
+                )
+            except (OSError, asyncio.IncompleteReadError):
+                if not reused or not idempotent:
+                    raise
+                # the remote closed an idle connection, reconnect once
+                await connection.close()
+                connection = await HttpConnection.open(
+                    self._host, self._port
+                )
+                response = await connection.request(
+                    method, path, payload, body
+                )
+        except BaseException:
+            await connection.close()
+            raise
+        await self._release(connection, response)
+        return response
+
+    async def _state_reached(
+        self, reached: Callable[[Dict[str, Any]], bool]
+    ) -> bool:
+        try:
+            response = await asyncio.wait_for(
+                self._send('GET', "/state", None, None), self._timeout
+            )
+        except (
+            OSError,
+            HttpError,
+            asyncio.IncompleteReadError,
+            asyncio.TimeoutError
+        ):
+            return False
+        return response.status_code < 400 and reached(response.json())
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Any] = None,
+        body: Optional[bytes] = None,
+        idempotent: bool = None,
+        reached: Callable[[Dict[str, Any]], bool] = None
+    ) -> Any:
+        # a failed request that is not idempotent may still have taken
+        # effect, it is only repeated if the remote's state says it did not
+        if idempotent is None:
+            idempotent = method == 'GET'
+        async with self._slots:
+            for attempt in range(self._retries + 1):
+                if attempt:
+                    if not idempotent and reached is None:
+                        break
+                    self._stats.record_retry()
+                    await asyncio.sleep(self._retry_delay * attempt)
+                    if reached is not None and await self._state_reached(
+                        reached
+                    ):
+                        return {}
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        self._send(method, path, payload, body, idempotent),
+                        self._timeout
+                    )
+                except (
+                    OSError,
+                    HttpError,
+                    asyncio.IncompleteReadError,
+                    asyncio.TimeoutError
+                ) as ex:
+                    error = ex
+                    continue
+                self._stats.record(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    self._stats.record_failure()
+                    raise RemoteError(
+                        self._device_id,
+                        f"{method} {path} failed: "
+                        + response.body.decode(errors='replace'),
+                        response.status_code
+                    )
+                return response.json()
+        self._stats.record_failure()
+        raise RemoteError(
+            self._device_id, f"{method} {path} failed: {error!r}"
+        )
+
+    async def get_state(self) -> Dict[str, Any]:
+        return await self.request('GET', "/state")
+
+    async def discover(self) -> Dict[str, Any]:
+        return await self.request('GET', "/discover")
+
+    async def register_master(self, port: int = None) -> Dict[str, Any]:
+        # the remote syncs its clock against a TimeServer on this host
+        return await self.request(
+            'POST',
+            "/discover",
+            {} if port is None else {'port': port},
+            idempotent=True
+        )
+
+    def _state_is(self, expected: str) -> Callable[[Dict[str, Any]], bool]:
+        return lambda state: state['controller']['state'] == expected
+
+    def _loaded(self, name: str) -> Callable[[Dict[str, Any]], bool]:
+        return lambda state: (
+            state['controller']['state'] == 'loaded'
+            and (state['program'] or {}).get('name', None) == name
+        )
+
+    async def upload_program(
+        self, name: str, event_list: List[Dict[str, Any]]
+    ) -> Any:
+        return await self.request(
+            'POST',
+            "/program",
+            {'name': name, 'event_list': event_list},
+            reached=self._loaded(name)
+        )
+
+    async def upload_payload(
+        self,
+        payload: Dict[str, Any],
+        use_cache: bool = True,
+        binary: bool = False
+    ) -> Any:
+        body = encode_program(payload) if binary else None
+        loaded = self._loaded(payload['name'])
+        if use_cache:
+            content_hash = (
+                payload_hash(payload) if body is None else body_hash(body)
+            )
+            try:
+                return await self.request(
+                    'POST', "/program", {'hash': content_hash},
+                    reached=loaded
+                )
+            except RemoteError as ex:
+                if ex.status_code != 404:
+                    raise
+        if body is None:
+            return await self.request(
+                'POST', "/program", payload, reached=loaded
+            )
+        return await self.request(
+            'POST', "/program", body=body, reached=loaded
+        )
+
+    async def unload_program(self) -> Any:
+        return await self.request(
+            'DELETE', "/program", reached=self._state_is('not_loaded')
+        )
+
+    async def control(self, action: str, **parameters) -> Any:
+        payload = {'action': action}
+        payload.update(parameters)
+        return await self.request(
+            'POST',
+            "/program/control",
+            payload,
+            reached=(
+                self._state_is(ACTION_STATES[action])
+                if action in ACTION_STATES else None
+            )
+        )
+
+    async def schedule(self, time: str) -> Any:
+        return await self.control('schedule', time=time)
+
+    async def run(self) -> Any:
+        return await self.control('run')
+
+    async def stop(self) -> Any:
+        return await self.control('stop')
+
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().close()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Tuple
+
+
+FUSE_LETTER: str = "a"
+
+
+class ShowCompileError(Exception):
+
+    problems: List[str]
+
+    def __init__(self, problems: List[str]):
+        super().__init__("\n".join(problems))
+        self.problems = problems
+
+
+def _validate_event(
+    index: int, event: Dict[str, Any], fuse_amounts: Dict[str, int]
+) -> List[str]:
+    if not isinstance(event, dict):
+        return [f"event {index}: not an object"]
+    for key in ('device_id', 'letter', 'number', 'timestamp', 'name'):
+        if key not in event:
+            return [f"event {index}: missing {key}"]
+    try:
+        int(event['number'])
+        float(event['timestamp'])
+    except (TypeError, ValueError):
+        return [
+            f"event {index}: non-numeric number {event['number']!r} "
+            + f"or timestamp {event['timestamp']!r}"
+        ]
+    device_id = str(event['device_id']).lower()
+    if device_id not in fuse_amounts:
+        return [f"event {index}: unknown device {device_id}"]
+    problems = []
+    if str(event['letter']).lower() != FUSE_LETTER:
+        problems.append(
+            f"event {index}: {device_id} has no fuse letter {event['letter']}"
+        )
+    if not 0 <= int(event['number']) < fuse_amounts[device_id]:
+        problems.append(
+            f"event {index}: {device_id} has no fuse number "
+            + f"{event['number']} (fuse amount {fuse_amounts[device_id]})"
+        )
+    if float(event['timestamp']) < 0:
+        problems.append(f"event {index}: negative timestamp")
+    return problems
+
+
+def _payload_checksum(payload: Dict[str, Any]) -> str:
+    encoded = json.dumps(payload, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def compile_show(
+    show: Dict[str, Any], fuse_amounts: Dict[str, int]
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Any]]:
+    fuse_amounts = {
+        device_id.lower(): amount
+        for device_id, amount in fuse_amounts.items()
+    }
+    for key in ('name', 'event_list'):
+        if key not in show:
+            raise ShowCompileError([f"show: missing {key}"])
+    event_lists: Dict[str, List[Dict[str, Any]]] = {}
+    problems = []
+    for index, event in enumerate(show['event_list']):
+        event_problems = _validate_event(index, event, fuse_amounts)
+        if event_problems:
+            problems.extend(event_problems)
+            continue
+        event_lists.setdefault(str(event['device_id']).lower(), []).append({
+            'name': event['name'],
+            'letter': event['letter'],
+            'number': event['number'],
+            'timestamp': event['timestamp']
+        })
+    if problems:
+        raise ShowCompileError(problems)
+
+    payloads = {}
+    devices = {}
+    for device_id, event_list in sorted(event_lists.items()):
+        event_list.sort(key=lambda event: float(event['timestamp']))
+        payload = {
+            'name': show['name'],
+            'device_id': device_id,
+            'event_list': event_list
+        }
+        payloads[device_id] = payload
+        devices[device_id] = {
+            'cue_count': len(event_list),
+            'fuse_amount': fuse_amounts[device_id],
+            'first_timestamp': event_list[0]['timestamp'],
+            'last_timestamp': event_list[-1]['timestamp'],
+            'checksum': _payload_checksum(payload)
+        }
+    manifest = {
+        'name': show['name'],
+        'cue_count': sum(device['cue_count'] for device in devices.values()),
+        'devices': devices
+    }
+    return payloads, manifest
@@ -0,0 +1,87 @@
+from typing import Dict, List, Optional
+
+
+class LatencyStats:
+
+    MAX_SAMPLES: int = 256
+
+    _samples: List[float]
+    _next_sample: int
+    _count: int
+    _failures: int
+    _retries: int
+    _total: float
+    _minimum: Optional[float]
+    _maximum: Optional[float]
+
+    def __init__(self):
+        self._samples = []
+        self._next_sample = 0
+        self._count = 0
+        self._failures = 0
+        self._retries = 0
+        self._total = 0.0
+        self._minimum = None
+        self._maximum = None
+
+    def record(self, seconds: float):
+        self._count += 1
+        self._total += seconds
+        if self._minimum is None or seconds < self._minimum:
+            self._minimum = seconds
+        if self._maximum is None or seconds > self._maximum:
+            self._maximum = seconds
+        if len(self._samples) < self.MAX_SAMPLES:
+            self._samples.append(seconds)
+        else:
+            self._samples[self._next_sample] = seconds
+        self._next_sample = (self._next_sample + 1) % self.MAX_SAMPLES
+
+    def record_retry(self):
+        self._retries += 1
+
+    def record_failure(self):
+        self._failures += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        samples = sorted(self._samples)
+        index = min(int(fraction * len(samples)), len(samples) - 1)
+        return samples[index]
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def failures(self) -> int:
+        return self._failures
+
+    @property
+    def retries(self) -> int:
+        return self._retries
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._total / self._count if self._count else None
+
+    @property
+    def minimum(self) -> Optional[float]:
+        return self._minimum
+
+    @property
+    def maximum(self) -> Optional[float]:
+        return self._maximum
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            'count': self._count,
+            'failures': self._failures,
+            'retries': self._retries,
+            'mean': self.mean,
+            'min': self._minimum,
+            'max': self._maximum,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95)
+        }
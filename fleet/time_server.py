@@ -0,0 +1,86 @@
+import asyncio
+import struct
+import time
+from typing import Optional, Tuple
+
+
+NTP_DELTA: int = 2208988800  # 1900-01-01 to 1970-01-01
+PACKET_SIZE: int = 48
+
+
+def ntp_timestamp(seconds: float) -> bytes:
+    whole = int(seconds)
+    fraction = int((seconds - whole) * (1 << 32)) & 0xFFFFFFFF
+    return struct.pack("!II", whole + NTP_DELTA, fraction)
+
+
+def unix_seconds(packet: bytes, position: int) -> float:
+    whole, fraction = struct.unpack_from("!II", packet, position)
+    return whole - NTP_DELTA + fraction / (1 << 32)
+
+
+class TimeServer(asyncio.DatagramProtocol):
+
+    PORT: int = 12300
+    STRATUM: int = 1
+
+    _offset: float
+    _transport: Optional[asyncio.DatagramTransport]
+    _requests: int
+
+    def __init__(self, offset: float = 0.0):
+        self._offset = offset
+        self._transport = None
+        self._requests = 0
+
+    async def start(
+        self, host: str = "0.0.0.0", port: int = PORT
+    ) -> 'TimeServer':
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(
+            lambda: self, local_addr=(host, port)
+        )
+        return self
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    @property
+    def port(self) -> int:
+        return self._transport.get_extra_info('sockname')[1]
+
+    @property
+    def requests(self) -> int:
+        return self._requests
+
+    def now(self) -> float:
+        return time.time() + self._offset
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, address: Tuple[str, int]):
+        receive = self.now()
+        # only answer client mode requests
+        if len(data) < PACKET_SIZE or data[0] & 0x07 != 3:
+            return
+        self._requests += 1
+        version = (data[0] >> 3) & 0x07
+        header = bytes((
+            (version << 3) | 4,  # leap indicator 0, server mode
+            self.STRATUM,
+            data[2],  # poll
+            0xEC  # precision, about a microsecond
+        ))
+        response = (
+            header
+            + bytes(8)  # root delay and dispersion
+            + b"LOCL"
+            + ntp_timestamp(receive)  # reference
+            + data[40:48]  # originate, the client's transmit field
+            + ntp_timestamp(receive)
+            + ntp_timestamp(self.now())
+        )
+        self._transport.sendto(response, address)
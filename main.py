@@ -1,16 +1,24 @@
 from backend.network_ import Network
 from backend.led import led
 from backend.webserver import webserver
-from backend import time_util as tu
 from backend.hardware import hardware
 from backend.logger import logger
+from backend.ntp_client import ntp_client
+from backend.master_clock import master_clock
+from backend.control_receiver import control_receiver
+from backend.announcer import announcer
 
 
 def entrypoint():
     logger.info("Running app...", "main.py")
     led.blink_long()
     Network.connect_wlan()
-    tu.set_ntp_time()
+    ntp_client.sync()
+    ntp_client.start_sync_timer()
+    master_clock.start_sync_timer()
+    control_receiver.start()
+    announcer.start(webserver.PORT)
+    logger.start_flush_timer()
     webserver.run()
 
 
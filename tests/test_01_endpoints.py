@@ -1,10 +1,13 @@
 import pytest
 import requests
+import socket
 import time
 from datetime import datetime as dt
 from datetime import timedelta
 from typing import Any, Dict, List
 
+from fleet import encode_program
+
 
 IP: str = "192.168.0.155"
 PORT: int = 5000
@@ -54,6 +57,15 @@ def test_discover():
     assert response.json()['is_remote']
 
 
+def test_discover_post():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.post(f"{URL}/discover", json={'port': 5000})
+    assert response.status_code == 200
+    assert response.json()['device_id'] == DEVICE_ID
+    assert response.json()['master_port'] == 5000
+    assert response.json()['master_ip'] is not None
+
+
 def test_index():
     time.sleep(WAIT_BEFORE_TEST)
     response = requests.get(f"{URL}/")
@@ -62,6 +74,17 @@ def test_index():
     assert "<html>" in response.text
 
 
+def test_index_gzip():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.get(
+        f"{URL}/", headers={'Accept-Encoding': "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers.get("Content-Encoding") == "gzip"
+    assert "max-age" in response.headers["Cache-Control"]
+    assert "<html>" in response.text
+
+
 def test_favicon():
     time.sleep(WAIT_BEFORE_TEST)
     response = requests.get(f"{URL}/favicon.ico", allow_redirects=False)
@@ -80,6 +103,17 @@ def test_static():
     assert "<html>" in response.text
 
 
+def test_static_range():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.get(
+        f"{URL}/static/device.html",
+        headers={'Range': "bytes=0-14", 'Accept-Encoding': "identity"}
+    )
+    assert response.status_code == 206
+    assert response.headers["Content-Range"].startswith("bytes 0-14/")
+    assert response.text == "<!DOCTYPE html>"
+
+
 def test_static_404():
     time.sleep(WAIT_BEFORE_TEST)
     response = requests.get(f"{URL}/static/nonexistent.file")
@@ -96,6 +130,179 @@ def test_program_delete(program_name: str, program: List[Dict[str, Any]]):
     _assert_standard_response(response, [200])
 
 
+def test_program_post_wrong_device(
+    program_name: str, program: List[Dict[str, Any]]
+):
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.post(
+        f"{URL}/program",
+        json={
+            'name': program_name,
+            'device_id': f"{DEVICE_ID}_other",
+            'event_list': program
+        }
+    )
+    assert response.status_code == 400
+
+
+def test_program_post_too_large():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.post(
+        f"{URL}/program",
+        data=bytes(64 * 1024),
+        headers={'Content-Type': "application/octet-stream"}
+    )
+    assert response.status_code == 413
+
+
+def test_program_post_unknown_hash():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.post(f"{URL}/program", json={'hash': "0" * 16})
+    _assert_standard_response(response, [404])
+
+
+def test_program_post_invalid_hash():
+    time.sleep(WAIT_BEFORE_TEST)
+    for content_hash in (16, "not a hash"):
+        response = requests.post(
+            f"{URL}/program", json={'hash': content_hash}
+        )
+        assert response.status_code == 400
+
+
+def test_program_post_cached(program_name: str, program: List[Dict[str, Any]]):
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.post(
+        f"{URL}/program",
+        json={'name': program_name, 'event_list': program}
+    )
+    _assert_standard_response(response, [200])
+    content_hash = response.headers["ETag"].strip("\"")
+    requests.delete(f"{URL}/program")
+    response = requests.post(f"{URL}/program", json={'hash': content_hash})
+    _assert_standard_response(response, [200])
+    requests.delete(f"{URL}/program")
+
+
+def test_program_post_binary(
+    program_name: str, program: List[Dict[str, Any]]
+):
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.post(
+        f"{URL}/program",
+        data=encode_program({
+            'name': program_name,
+            'device_id': DEVICE_ID,
+            'event_list': program
+        }),
+        headers={'Content-Type': "application/octet-stream"}
+    )
+    _assert_standard_response(response, [200])
+    response = requests.get(f"{URL}/program/commands")
+    assert response.json()['total'] == len(program)
+    requests.delete(f"{URL}/program")
+
+
+def test_program_patch(program_name: str, program: List[Dict[str, Any]]):
+    time.sleep(WAIT_BEFORE_TEST)
+    requests.post(
+        f"{URL}/program",
+        json={'name': program_name, 'event_list': program}
+    )
+    response = requests.patch(
+        f"{URL}/program",
+        json={
+            'remove': [1],
+            'retime': [{'id': 0, 'timestamp': WAIT_BETWEEN_FUSES * 2.5}],
+            'add': [{'name': "added", 'letter': "a", 'number': 1,
+                     'timestamp': 0}]
+        }
+    )
+    assert response.status_code == 200
+    added = response.json()['added']
+    assert len(added) == 1
+    assert response.json()['removed'] == [1]
+    version = response.json()['version']
+    response = requests.get(f"{URL}/program/commands")
+    commands = response.json()['commands']
+    assert [command['id'] for command in commands] == [added[0], 2, 0, 3]
+    response = requests.patch(f"{URL}/program", json={'remove': [2]})
+    response = requests.get(
+        f"{URL}/program/commands", params={'since_version': version}
+    )
+    assert response.json()['removed'] == [2]
+    requests.delete(f"{URL}/program")
+
+
+def test_program_patch_invalid(
+    program_name: str, program: List[Dict[str, Any]]
+):
+    time.sleep(WAIT_BEFORE_TEST)
+    requests.post(
+        f"{URL}/program",
+        json={'name': program_name, 'event_list': program}
+    )
+    version = requests.get(f"{URL}/program/commands").json()['version']
+    for changes in (
+        {'remove': [1, 1]},
+        {'remove': [1], 'retime': [{'id': 1, 'timestamp': 1}]},
+        {'remove': [FUSE_AMOUNT]},
+        {'retime': [{'id': 1}]},
+        {'add': [{'name': "added", 'timestamp': 0}]},
+        {'add': [{'name': "added", 'letter': "a", 'number': FUSE_AMOUNT,
+                  'timestamp': 0}]}
+    ):
+        response = requests.patch(f"{URL}/program", json=changes)
+        assert response.status_code == 400
+    response = requests.get(f"{URL}/program/commands")
+    assert response.json()['version'] == version
+    assert response.json()['total'] == len(program)
+    requests.delete(f"{URL}/program")
+
+
+def test_program_control_schedule_past(
+    program_name: str, program: List[Dict[str, Any]]
+):
+    time.sleep(WAIT_BEFORE_TEST)
+    requests.post(
+        f"{URL}/program",
+        json={'name': program_name, 'event_list': program}
+    )
+    schedule_time = (dt.now() - timedelta(seconds=10)).isoformat()
+    response = requests.post(
+        f"{URL}/program/control",
+        json={'action': 'schedule', 'time': schedule_time}
+    )
+    assert response.status_code == 400
+    response = requests.get(f"{URL}/state")
+    assert response.json()['controller']['state'] == "loaded"
+    requests.delete(f"{URL}/program")
+
+
+def test_program_control_schedule_immediate(
+    program_name: str, program: List[Dict[str, Any]]
+):
+    time.sleep(WAIT_BEFORE_TEST)
+    requests.post(
+        f"{URL}/program",
+        json={'name': program_name, 'event_list': program}
+    )
+    schedule_time = (dt.now() + timedelta(milliseconds=10)).isoformat()
+    response = requests.post(
+        f"{URL}/program/control",
+        json={'action': 'schedule', 'time': schedule_time}
+    )
+    _assert_standard_response(response, [200])
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.get(f"{URL}/state")
+    assert response.json()['controller']['state'] == "running"
+    response = requests.post(
+        f"{URL}/program/control",
+        json={'action': 'stop'}
+    )
+    _assert_standard_response(response, [200])
+
+
 def test_program_post(program_name: str, program: List[Dict[str, Any]]):
     time.sleep(WAIT_BEFORE_TEST)
     response = requests.post(
@@ -226,6 +433,15 @@ def test_event_stream():
     _assert_standard_response(response, [200])
 
 
+def test_event_stream_head():
+    time.sleep(WAIT_BEFORE_TEST)
+    for location in ("/event-stream", "/logs/stream"):
+        response = requests.head(f"{URL}{location}", timeout=5)
+        assert response.status_code == 200
+        assert "text/event-stream" in response.headers["Content-Type"]
+        assert response.content == b""
+
+
 def test_state():
     time.sleep(WAIT_BEFORE_TEST)
     response = requests.get(f"{URL}/state")
@@ -237,6 +453,7 @@ def test_state():
     assert 'schedule' in response.json()
     assert 'program' in response.json()
     assert 'update_needed' in response.json()
+    assert 'clock' in response.json()
     state = response.json()
     assert state['controller']['state'] == "not_loaded"
     assert state['hardware']['is_locked'] is False
@@ -244,6 +461,33 @@ def test_state():
     assert state['update_needed'] is None
 
 
+def test_state_not_modified():
+    time.sleep(WAIT_BEFORE_TEST)
+    etag = requests.get(f"{URL}/state").headers["ETag"]
+    response = requests.get(
+        f"{URL}/state", headers={'If-None-Match': etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert "Content-Type" not in response.headers
+    assert response.text == ""
+
+
+def test_state_fields():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.get(f"{URL}/state?fields=controller,config")
+    assert response.status_code == 200
+    assert set(response.json()) == {'controller', 'config'}
+    response = requests.get(f"{URL}/state?fields=nonexistent")
+    assert response.status_code == 400
+
+
+def test_program_commands_not_loaded():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.get(f"{URL}/program/commands?offset=0&limit=10")
+    assert response.status_code == 400
+
+
 def test_logs():
     time.sleep(WAIT_BEFORE_TEST)
     response = requests.get(f"{URL}/logs")
@@ -273,6 +517,40 @@ def test_logs_structured_file():
     ])
 
 
+def test_logs_raw_file():
+    time.sleep(WAIT_BEFORE_TEST)
+    last_log = requests.get(f"{URL}/logs").json()[-1]
+    response = requests.get(f"{URL}/logs/raw/{last_log}")
+    assert response.status_code == 200
+    assert "application/octet-stream" in response.headers["Content-Type"]
+    assert response.content.startswith(b"RLG1")
+
+
+def test_logs_query():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.get(
+        f"{URL}/logs/query", params={'level': "info", 'limit': 5}
+    )
+    assert response.status_code == 200
+    assert "application/json" in response.headers["Content-Type"]
+    records = response.json()
+    assert len(records) <= 5
+    assert all(record['level'] != "debug" for record in records)
+
+
+def test_logs_aborted_download():
+    time.sleep(WAIT_BEFORE_TEST)
+    last_log = requests.get(f"{URL}/logs").json()[-1]
+    with socket.create_connection((IP, PORT)) as client:
+        client.sendall(
+            f"GET /logs/{last_log} HTTP/1.1\r\nHost: {IP}\r\n\r\n"
+            .encode('ascii')
+        )
+        client.recv(64)
+    response = requests.get(f"{URL}/discover")
+    assert response.status_code == 200
+
+
 def test_logs_file_delete():
     time.sleep(WAIT_BEFORE_TEST)
     last_log = requests.get(f"{URL}/logs").json()[-1]
@@ -294,8 +572,37 @@ def test_config_get():
 
 def test_config_post():
     time.sleep(WAIT_BEFORE_TEST)
-    response = requests.post(f"{URL}/config")
-    _assert_standard_response(response, [501])
+    response = requests.post(
+        f"{URL}/config",
+        json={'log_level': "info", 'module_log_levels': {'hardware': "debug"}}
+    )
+    _assert_standard_response(response, [200])
+    config = requests.get(f"{URL}/config").json()
+    assert config['log_level'] == "info"
+    assert config['module_log_levels'] == {'hardware': "debug"}
+    response = requests.post(
+        f"{URL}/config", json={'module_log_levels': {'hardware': None}}
+    )
+    _assert_standard_response(response, [200])
+
+
+def test_config_post_invalid_level():
+    time.sleep(WAIT_BEFORE_TEST)
+    response = requests.post(f"{URL}/config", json={'log_level': "loud"})
+    assert response.status_code == 400
+
+
+def test_config_post_is_atomic():
+    time.sleep(WAIT_BEFORE_TEST)
+    for data in (
+        {'log_level': "debug", 'module_log_levels': "hardware"},
+        {'log_level': "debug", 'module_log_levels': {'hardware': "loud"}}
+    ):
+        response = requests.post(f"{URL}/config", json=data)
+        assert response.status_code == 400
+    config = requests.get(f"{URL}/config").json()
+    assert config['log_level'] == "info"
+    assert config['module_log_levels'] == {}
 
 
 def test_update():
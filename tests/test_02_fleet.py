@@ -0,0 +1,584 @@
+import asyncio
+import json
+import socket
+import struct
+import time
+from typing import List
+
+from backend import control_packet, ntp_packet
+from fleet import (
+    ControlSender,
+    DiscoveryListener,
+    FleetClient,
+    RemoteClient,
+    RemoteError,
+    ShowCompileError,
+    TimeServer,
+    compile_show,
+    decode_program,
+    encode_program
+)
+from fleet.control import (
+    ACTION_ARM, ACTION_GO, ACTION_STOP, device_timestamp
+)
+from fleet.discovery import parse_announcement
+from fleet.emulator import EmulatedRemote
+from fleet.time_server import unix_seconds
+
+
+DEVICE_AMOUNT: int = 8
+DELAY: float = 0.2
+
+
+def _event_list(device_id: str) -> List[dict]:
+    return [
+        {
+            'name': f"fuse{i}",
+            'device_id': device_id,
+            'letter': "a",
+            'number': i,
+            'timestamp': i
+        }
+        for i in range(4)
+    ]
+
+
+async def _start_remotes(amount: int, **kwargs) -> List[EmulatedRemote]:
+    return [
+        await EmulatedRemote(f"remote{i}", **kwargs).start()
+        for i in range(amount)
+    ]
+
+
+def _fleet(remotes: List[EmulatedRemote], **kwargs) -> FleetClient:
+    return FleetClient(
+        RemoteClient(
+            "127.0.0.1", remote.port, device_id=remote.device_id, **kwargs
+        )
+        for remote in remotes
+    )
+
+
+def test_fan_out_is_parallel():
+    async def scenario():
+        remotes = await _start_remotes(DEVICE_AMOUNT, delay=DELAY)
+        async with _fleet(remotes) as fleet:
+            start = time.perf_counter()
+            results = await fleet.upload("show", {
+                remote.device_id: _event_list(remote.device_id)
+                for remote in remotes
+            })
+            duration = time.perf_counter() - start
+            states = await fleet.collect_state()
+            stats = fleet.latency_stats()
+        for remote in remotes:
+            await remote.close()
+        return remotes, results, duration, states, stats
+
+    remotes, results, duration, states, stats = asyncio.run(scenario())
+    assert all(result.ok for result in results.values())
+    assert duration < DELAY * DEVICE_AMOUNT / 2
+    for remote in remotes:
+        assert remote.program['event_list'] == _event_list(remote.device_id)
+        assert states[remote.device_id].value['controller']['state'] == (
+            "loaded"
+        )
+        assert stats[remote.device_id].count == 2
+
+
+def test_retry_after_dropped_request():
+    async def scenario():
+        remote = await EmulatedRemote("remote0", drop_requests=1).start()
+        async with _fleet([remote]) as fleet:
+            results = await fleet.collect_state()
+            stats = fleet.latency_stats()['remote0']
+        await remote.close()
+        return results, stats
+
+    results, stats = asyncio.run(scenario())
+    assert results['remote0'].ok
+    assert stats.retries == 1
+    assert stats.failures == 0
+
+
+def test_lost_responses_are_checked_before_retry():
+    async def scenario():
+        emulated = await EmulatedRemote("remote0", drop_responses=1).start()
+        remote = RemoteClient("127.0.0.1", emulated.port, device_id="remote0")
+        await remote.upload_program("show", _event_list("remote0"))
+        emulated.drop_responses = 1
+        await remote.run()
+        await remote.close()
+        await emulated.close()
+        return emulated, remote.stats
+
+    emulated, stats = asyncio.run(scenario())
+    assert emulated.state == "running"
+    assert emulated.requests == [
+        ('POST', "/program"),
+        ('GET', "/state"),
+        ('POST', "/program/control"),
+        ('GET', "/state")
+    ]
+    assert stats.retries == 2
+    assert stats.failures == 0
+
+
+def test_timeout_only_affects_slow_device():
+    async def scenario():
+        fast = await EmulatedRemote("remote0").start()
+        slow = await EmulatedRemote("remote1", delay=1.0).start()
+        async with _fleet([fast, slow], timeout=0.2, retries=1) as fleet:
+            results = await fleet.collect_state()
+        await fast.close()
+        await slow.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results['remote0'].ok
+    assert not results['remote1'].ok
+    assert isinstance(results['remote1'].error, RemoteError)
+
+
+def test_error_status_is_not_retried():
+    async def scenario():
+        remote = await EmulatedRemote("remote0").start()
+        async with _fleet([remote]) as fleet:
+            results = await fleet.run()
+        await remote.close()
+        return remote, results
+
+    remote, results = asyncio.run(scenario())
+    assert results['remote0'].error.status_code == 400
+    assert remote.requests == [('POST', "/program/control")]
+
+
+def test_keep_alive_connections_are_reused():
+    async def scenario():
+        remote = await EmulatedRemote("remote0", keep_alive=True).start()
+        async with _fleet([remote]) as fleet:
+            for _ in range(3):
+                await fleet.collect_state()
+        await remote.close()
+        return remote
+
+    remote = asyncio.run(scenario())
+    assert remote.connections == 1
+    assert len(remote.requests) == 3
+
+
+def test_compile_show_shards_by_device():
+    show = {
+        'name': "show",
+        'event_list': _event_list("remote0") + _event_list("remote1")
+    }
+    payloads, manifest = compile_show(show, {'remote0': 4, 'remote1': 4})
+    assert set(payloads) == {'remote0', 'remote1'}
+    assert payloads['remote1']['device_id'] == "remote1"
+    assert all(
+        'device_id' not in event
+        for event in payloads['remote1']['event_list']
+    )
+    assert manifest['cue_count'] == 8
+    assert manifest['devices']['remote0']['cue_count'] == 4
+    assert manifest['devices']['remote0']['checksum'] != (
+        manifest['devices']['remote1']['checksum']
+    )
+
+
+def test_compile_show_validates_fuse_amounts():
+    show = {
+        'name': "show",
+        'event_list': _event_list("remote0") + _event_list("remote9")
+    }
+    try:
+        compile_show(show, {'remote0': 2})
+    except ShowCompileError as ex:
+        problems = ex.problems
+    else:
+        problems = []
+    assert len(problems) == 6
+    assert any("fuse number 3" in problem for problem in problems)
+    assert any("unknown device remote9" in problem for problem in problems)
+
+
+def test_compile_show_reports_malformed_events():
+    event_list = _event_list("remote0")
+    event_list[0]['number'] = "one"
+    event_list[1]['timestamp'] = None
+    del event_list[2]['name']
+    try:
+        compile_show(
+            {'name': "show", 'event_list': event_list + ["cue"]},
+            {'remote0': 16}
+        )
+    except ShowCompileError as ex:
+        problems = ex.problems
+    else:
+        problems = []
+    assert len(problems) == 4
+    assert problems[0].startswith("event 0: non-numeric")
+    assert problems[1].startswith("event 1: non-numeric")
+    assert problems[2] == "event 2: missing name"
+    assert problems[3] == f"event {len(event_list)}: not an object"
+
+
+def test_upload_show_and_wrong_device():
+    async def scenario():
+        remotes = await _start_remotes(3)
+        async with _fleet(remotes) as fleet:
+            show = {
+                'name': "show",
+                'event_list': [
+                    event
+                    for remote in remotes
+                    for event in _event_list(remote.device_id)
+                ]
+            }
+            payloads, _ = compile_show(show, await fleet.fuse_amounts())
+            results = await fleet.upload_show(payloads)
+            await fleet.unload()
+            wrong = None
+            try:
+                await fleet.remotes['remote0'].upload_payload(
+                    payloads['remote1']
+                )
+            except RemoteError as ex:
+                wrong = ex
+        for remote in remotes:
+            await remote.close()
+        return remotes, results, wrong
+
+    remotes, results, wrong = asyncio.run(scenario())
+    assert all(result.ok for result in results.values())
+    assert remotes[2].requests[-2:] == [
+        ('POST', "/program"), ('DELETE', "/program")
+    ]
+    assert remotes[0].program is None
+    assert wrong.status_code == 400
+
+
+def test_upload_skips_body_for_cached_program():
+    async def scenario():
+        remote = await EmulatedRemote("remote0").start()
+        payload = {
+            'name': "show",
+            'device_id': "remote0",
+            'event_list': _event_list("remote0")
+        }
+        async with _fleet([remote]) as fleet:
+            await fleet.upload_show({'remote0': payload})
+            await fleet.unload()
+            await fleet.upload_show({'remote0': payload})
+        await remote.close()
+        return remote
+
+    remote = asyncio.run(scenario())
+    assert remote.requests == [
+        ('POST', "/program"),
+        ('POST', "/program"),
+        ('DELETE', "/program"),
+        ('POST', "/program")
+    ]
+    assert remote.state == "loaded"
+
+
+def test_binary_program_round_trip_is_compact():
+    with open("test_program.json", 'r') as file:
+        event_list = json.load(file)
+    payload = {
+        'name': "test_program",
+        'device_id': "remote0",
+        'event_list': [
+            {
+                'name': event['name'],
+                'letter': event['letter'].lower(),
+                'number': event['number'],
+                'timestamp': event['timestamp']
+            }
+            for event in event_list
+        ]
+    }
+    encoded = encode_program(payload)
+    assert decode_program(encoded) == payload
+    show = {
+        'name': "test_program",
+        'device_id': "remote0",
+        'event_list': [
+            {
+                'name': f"fuseA{i % 16}",
+                'device_id': "remote0",
+                'letter': "A",
+                'number': i % 16,
+                'timestamp': i / 4
+            }
+            for i in range(512)
+        ]
+    }
+    unnamed = encode_program(show, include_names=False)
+    assert len(unnamed) * 10 < len(json.dumps(show))
+    corrupt = bytearray(encoded)
+    corrupt[-1] ^= 0xFF
+    try:
+        decode_program(bytes(corrupt))
+    except ValueError:
+        pass
+    else:
+        assert False, "checksum mismatch not detected"
+
+
+def test_binary_upload_and_cache():
+    async def scenario():
+        remote = await EmulatedRemote("remote0").start()
+        payload = {
+            'name': "show",
+            'device_id': "remote0",
+            'event_list': _event_list("remote0")
+        }
+        async with _fleet([remote]) as fleet:
+            await fleet.upload_show({'remote0': payload}, binary=True)
+            program = remote.program
+            await fleet.unload()
+            await fleet.upload_show({'remote0': payload}, binary=True)
+        await remote.close()
+        return remote, program
+
+    remote, program = asyncio.run(scenario())
+    assert [event['timestamp'] for event in program['event_list']] == [
+        0, 1, 2, 3
+    ]
+    assert remote.requests == [
+        ('POST', "/program"),
+        ('POST', "/program"),
+        ('DELETE', "/program"),
+        ('POST', "/program")
+    ]
+    assert remote.state == "loaded"
+
+
+def _ntp_sample(port: int, cookie: int) -> tuple:
+    # the same request backend/ntp_client.py sends: client mode and a
+    # cookie in the transmit field that has to come back as originate
+    packet = bytearray(48)
+    packet[0] = 0x23
+    struct.pack_into("!II", packet, 40, cookie, cookie)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(1.0)
+        originate = time.time()
+        sock.sendto(packet, ("127.0.0.1", port))
+        response = sock.recv(48)
+        destination = time.time()
+    assert response[0] & 0x07 == 4
+    assert struct.unpack_from("!II", response, 24) == (cookie, cookie)
+    receive = unix_seconds(response, 32)
+    transmit = unix_seconds(response, 40)
+    offset = ((receive - originate) + (transmit - destination)) / 2
+    delay = (destination - originate) - (transmit - receive)
+    return offset, delay
+
+
+def test_time_server_answers_ntp_client_requests():
+    async def scenario():
+        server = await TimeServer(offset=2.5).start("127.0.0.1", 0)
+        loop = asyncio.get_running_loop()
+        samples = [
+            await loop.run_in_executor(None, _ntp_sample, server.port, i)
+            for i in range(4)
+        ]
+        requests = server.requests
+        server.close()
+        return samples, requests
+
+    samples, requests = asyncio.run(scenario())
+    assert requests == 4
+    offset, delay = min(samples, key=lambda sample: sample[1])
+    assert abs(offset - 2.5) < 0.05
+    assert 0 <= delay < 0.05
+
+
+def _client_sample(port: int, cookie: int) -> tuple:
+    packet = bytearray(ntp_packet.PACKET_SIZE)
+    ntp_packet.prepare_request(packet, cookie)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(1.0)
+        originate = int(time.time() * 1000)
+        sock.sendto(packet, ("127.0.0.1", port))
+        response = sock.recv(ntp_packet.PACKET_SIZE)
+        destination = int(time.time() * 1000)
+    return ntp_packet.offset_and_delay(
+        response, cookie, originate, destination
+    )
+
+
+def test_ntp_client_syncs_against_time_server():
+    async def scenario():
+        server = await TimeServer(offset=-1.25).start("127.0.0.1", 0)
+        loop = asyncio.get_running_loop()
+        samples = [
+            await loop.run_in_executor(None, _client_sample, server.port, i)
+            for i in range(4)
+        ]
+        server.close()
+        return samples
+
+    samples = asyncio.run(scenario())
+    assert None not in samples
+    offset, delay = min(samples, key=lambda sample: sample[1])
+    assert abs(offset + 1250) <= 50
+    assert 0 <= delay < 50
+    assert ntp_packet.offset_and_delay(
+        bytes(ntp_packet.PACKET_SIZE), 0, 0, 0
+    ) is None
+
+
+def test_control_datagrams_are_verified_by_the_firmware():
+    async def scenario():
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as receiver:
+            receiver.bind(("127.0.0.1", 0))
+            receiver.settimeout(1.0)
+            sender = ControlSender(
+                "test_key", "127.0.0.1", receiver.getsockname()[1]
+            )
+            sent = await sender.go()
+            sender.close()
+            received = [
+                receiver.recv(control_packet.DATAGRAM_SIZE)
+                for _ in range(sender.REPEAT)
+            ]
+        return sent, received
+
+    sent, received = asyncio.run(scenario())
+    assert received == [sent] * len(received)
+    now = device_timestamp(time.time())
+    verifier = control_packet.ControlVerifier(b"test_key")
+    action, sequence, target = verifier.verify(received[0], now)
+    assert action == ACTION_GO
+    assert abs(target - now) < 1000
+    assert verifier.verify(received[1], now) is None
+
+    sender = ControlSender("test_key")
+    older = sender.datagram(ACTION_STOP, time.time())
+    newer = sender.datagram(ACTION_STOP, time.time())
+    assert verifier.verify(newer, now) is not None
+    assert verifier.verify(older, now) is None
+    for datagram in (
+        ControlSender("other_key").datagram(ACTION_STOP, time.time() + 1),
+        sender.datagram(ACTION_STOP, time.time() - 5),
+        sender.datagram(ACTION_ARM, time.time() + 2 * 24 * 3600)
+    ):
+        try:
+            control_packet.ControlVerifier(b"test_key").verify(datagram, now)
+        except control_packet.InvalidDatagram:
+            pass
+        else:
+            raise AssertionError("datagram accepted")
+    disabled = control_packet.ControlVerifier(None)
+    assert not disabled.enabled
+    datagram = sender.datagram(ACTION_GO, time.time())
+    assert disabled.verify(datagram, now) is None
+
+
+def test_discovery_listener_collects_announcements():
+    announcement = {
+        'device_id': "remote3",
+        'fuse_amount': 4,
+        'firmware_version': "0.1.0",
+        'port': 5000,
+        'state': "not_loaded",
+        'state_version': "0.0.0.0.0"
+    }
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        listener = await DiscoveryListener().start("127.0.0.1", 0)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as remote:
+            remote.bind(("127.0.0.1", 0))
+            remote.settimeout(1.0)
+            listener.query(remote.getsockname())
+            query, address = await loop.run_in_executor(
+                None, remote.recvfrom, 16
+            )
+            remote.sendto(json.dumps(announcement).encode(), address)
+            remote.sendto(b"not an announcement", address)
+        await asyncio.sleep(DELAY)
+        listener.close()
+        return query, listener
+
+    query, listener = asyncio.run(scenario())
+    assert query == b"RLD?"
+    assert list(listener.remotes) == ["remote3"]
+    assert listener.remotes["remote3"]['host'] == "127.0.0.1"
+    assert listener.remotes["remote3"]['fuse_amount'] == 4
+    assert [
+        (client.host, client.port, client.device_id)
+        for client in listener.clients()
+    ] == [("127.0.0.1", 5000, "remote3")]
+    assert parse_announcement(b"[]", "127.0.0.1") is None
+    assert parse_announcement(b'{"device_id": "x"}', "127.0.0.1") is None
+
+
+def test_register_master():
+    async def scenario():
+        remotes = await _start_remotes(2)
+        async with _fleet(remotes) as fleet:
+            results = await fleet.register_master(8080)
+        for remote in remotes:
+            await remote.close()
+        return remotes, results
+
+    remotes, results = asyncio.run(scenario())
+    assert all(result.ok for result in results.values())
+    assert [remote.master for remote in remotes] == [
+        ("127.0.0.1", 8080), ("127.0.0.1", 8080)
+    ]
+
+
+def test_rejected_upload_is_not_cached():
+    async def scenario():
+        remote = await EmulatedRemote("remote0").start()
+        payload = {
+            'name': "show",
+            'device_id': "remote1",
+            'event_list': _event_list("remote1")
+        }
+        async with _fleet([remote]) as fleet:
+            first = await fleet.upload_show({'remote0': payload})
+            second = await fleet.upload_show({'remote0': payload})
+        await remote.close()
+        return remote, first, second
+
+    remote, first, second = asyncio.run(scenario())
+    assert not first['remote0'].ok and not second['remote0'].ok
+    # every attempt has to fall back to the full body
+    assert remote.requests == [('POST', "/program")] * 4
+    assert remote.state == "not_loaded"
+
+
+def test_emulator_checks_state_before_cache():
+    async def status(remote: RemoteClient, method: str, payload=None):
+        try:
+            await remote.request(method, "/program", payload)
+        except RemoteError as ex:
+            return ex.status_code
+        return 200
+
+    async def scenario():
+        emulated = await EmulatedRemote("remote0").start()
+        remote = RemoteClient(
+            "127.0.0.1", emulated.port, device_id="remote0", retries=0
+        )
+        codes = [
+            await status(remote, 'DELETE'),
+            await status(remote, 'POST', {'hash': 16}),
+            await status(remote, 'POST', {'hash': "0" * 16}),
+            await status(remote, 'POST', {
+                'name': "show", 'event_list': _event_list("remote0")
+            }),
+            await status(remote, 'POST', {'hash': "0" * 16}),
+            await status(remote, 'DELETE')
+        ]
+        await remote.close()
+        await emulated.close()
+        return codes
+
+    assert asyncio.run(scenario()) == [400, 400, 404, 200, 400, 200]
@@ -0,0 +1,44 @@
+"""
+Stores a gzip compressed copy next to every file in frontend/.
+
+Run this on the host before copying the tree to a device. The webserver
+serves the .gz copy with Content-Encoding: gzip to clients that accept
+it, so the device never has to compress anything itself.
+"""
+import gzip
+import os
+import sys
+
+
+FRONTEND_DIRECTORY: str = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend"
+)
+COMPRESSED_SUFFIX: str = ".gz"
+
+
+def compress_file(path: str) -> tuple[int, int]:
+    with open(path, 'rb') as file:
+        content = file.read()
+    compressed = gzip.compress(content, compresslevel=9, mtime=0)
+    with open(path + COMPRESSED_SUFFIX, 'wb') as file:
+        file.write(compressed)
+    return len(content), len(compressed)
+
+
+def compress_directory(directory: str):
+    for root, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if filename.endswith(COMPRESSED_SUFFIX):
+                continue
+            path = os.path.join(root, filename)
+            size, compressed_size = compress_file(path)
+            print(
+                f"{os.path.relpath(path, directory)}: "
+                + f"{size} -> {compressed_size} bytes"
+            )
+
+
+if __name__ == "__main__":
+    compress_directory(
+        sys.argv[1] if len(sys.argv) > 1 else FRONTEND_DIRECTORY
+    )